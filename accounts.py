@@ -0,0 +1,166 @@
+import asyncio
+import json
+import time
+
+from changes import ChangeDetector, combine
+from engine import SCOPE_MONITORED, Watcher, is_success, run_polls
+from scheduler import PollScheduler
+from snipe import Sniper
+
+
+class AccountClient:
+    """共享 AutoDLClient 连接池的单账号视图，请求时带上该账号的 token"""
+
+    def __init__(self, client, token):
+        self.client = client
+        self.token = token
+
+    @property
+    def fast_used_at(self):
+        return self.client.fast_used_at
+
+    async def machine_list(self, page_index=1, page_size=4):
+        return await self.client.machine_list(page_index, page_size, token=self.token)
+
+    async def instance_list(self, page_index=1, page_size=10):
+        return await self.client.instance_list(
+            page_index, page_size, token=self.token
+        )
+
+    async def power_on(self, instance_uuid):
+        return await self.client.power_on(instance_uuid, token=self.token)
+
+    async def warm(self):
+        await self.client.warm()
+
+
+class Account:
+    def __init__(self, name, watcher):
+        self.name = name
+        self.watcher = watcher
+
+
+def load_accounts(path):
+    """读取账号配置，格式为 JSON 列表:
+
+    [{"name": "组A", "token": "...", "machines": ["机器ID"], "instances": ["实例ID"]}]
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class MultiWatcher:
+    """多个账号共用一个连接池和一个调度器
+
+    每个账号有自己的 Watcher（被监控机器、自动开机实例、页码索引），
+    但不各自运行定时任务，而是由这里统一按节奏检查。多个账号都能看到的
+    机器每次只由其中一个账号拉取，结果合并后交给所有账号处理。
+
+    事件:
+        status(result)    所有账号本次拉取到的机器合并后的快照
+    """
+
+    def __init__(self, client, interval=5.0, scope=SCOPE_MONITORED, **options):
+        self.client = client
+        self.scope = scope
+        self.options = options
+        self.accounts = []
+        self.scheduler = PollScheduler(interval)
+        self.sniper = Sniper(client)
+        # 合并快照没有变化时不再分发 status 事件（历史记录）
+        self.changes = ChangeDetector()
+        self._listeners = {}
+        self._task = None
+        self._warm_task = None
+
+    def subscribe(self, event, callback):
+        self._listeners.setdefault(event, []).append(callback)
+
+    def emit(self, event, *args):
+        for callback in self._listeners.get(event, []):
+            callback(*args)
+
+    def add_account(self, name, token, machines=(), instances=(), threshold=1):
+        watcher = Watcher(
+            AccountClient(self.client, token),
+            threshold=threshold,
+            scope=self.scope,
+            **self.options,
+        )
+        watcher.monitored_machines.update(machines)
+        watcher.arm(instances)
+        account = Account(name, watcher)
+        self.accounts.append(account)
+        return account
+
+    async def fetch_snapshots(self):
+        """按账号拉取，返回与 accounts 顺序一致的结果列表"""
+        covered = set()
+        jobs = []
+        for account in self.accounts:
+            watcher = account.watcher
+            if watcher.scope != SCOPE_MONITORED:
+                jobs.append(watcher.fetch_snapshot())
+                continue
+            # 已由前面的账号拉取的机器跳过，只拉取该账号独有的部分
+            own = watcher.watched_machines() - covered
+            covered |= own & set(watcher.page_index_map.pages)
+            jobs.append(watcher.fetch_monitored_pages(own))
+        return await asyncio.gather(*jobs)
+
+    async def check_status(self):
+        results = await self.fetch_snapshots()
+        detected_at = time.perf_counter()
+        merged = {}
+        first = None
+        for result in results:
+            if is_success(result):
+                first = first or result
+                for machine in result["data"]["list"]:
+                    merged[machine.machine_id] = machine
+        if first is None:
+            for account, result in zip(self.accounts, results):
+                account.watcher.process_snapshot(result, detected_at)
+            return results[0] if results else {"error": "没有账号"}
+
+        snapshot = {
+            **first,
+            "data": {**first["data"], "list": list(merged.values())},
+            "fingerprint": combine(
+                result.get("fingerprint") for result in results if is_success(result)
+            ),
+        }
+        for account, result in zip(self.accounts, results):
+            # 自己拉取失败的账号照常报告错误，其余账号都基于合并后的快照处理
+            account.watcher.process_snapshot(
+                snapshot if is_success(result) else result, detected_at
+            )
+        changed = self.changes.changed(snapshot["fingerprint"])
+        gaps = [
+            account.watcher.gap
+            for account in self.accounts
+            if account.watcher.gap is not None
+        ]
+        self.scheduler.observe(changed, min(gaps, default=None))
+        if changed:
+            self.emit("status", snapshot)
+        return snapshot
+
+    async def run(self):
+        for account in self.accounts:
+            if account.watcher.armed_instances:
+                account.watcher.spawn(account.watcher.refresh_instances())
+        await run_polls(self.check_status, self.scheduler)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self.run())
+            self._warm_task = asyncio.ensure_future(self.sniper.keep_warm())
+
+    def stop(self):
+        for task in (self._task, self._warm_task):
+            if task is not None:
+                task.cancel()
+        self._task = self._warm_task = None
+        for account in self.accounts:
+            account.watcher.stop()
@@ -0,0 +1,94 @@
+import time
+
+
+class AvailabilityTracker:
+    """按机器记录是否处于可用状态，只在由不可用变为可用时触发一次
+
+    同一台机器两次触发之间至少间隔 cooldown 秒，避免状态来回抖动时重复通知。
+    冷却期内变为可用的机器记在 waiting 中，冷却结束后仍可用时再触发。
+    """
+
+    def __init__(self, cooldown=60.0):
+        self.cooldown = cooldown
+        self.available = {}
+        self.last_fired = {}
+        self.waiting = set()
+
+    def update(self, machine_id, available, now=None):
+        """记录最新状态，返回本次是否应当触发"""
+        now = time.monotonic() if now is None else now
+        if not available:
+            self.available[machine_id] = False
+            self.waiting.discard(machine_id)
+            return False
+        if self.available.get(machine_id, False):
+            return False
+        last = self.last_fired.get(machine_id)
+        if last is not None and now - last < self.cooldown:
+            # 还在冷却期内：不记为已可用，之后的检查中再判断
+            self.waiting.add(machine_id)
+            return False
+        self.available[machine_id] = True
+        self.last_fired[machine_id] = now
+        self.waiting.discard(machine_id)
+        return True
+
+    def forget(self, keep):
+        """丢弃不再监控的机器的状态，重新监控时按首次出现处理"""
+        for machine_id in set(self.available) - set(keep):
+            del self.available[machine_id]
+            self.last_fired.pop(machine_id, None)
+        self.waiting &= set(keep)
+
+
+class PowerOnGuard:
+    """每个实例同一时间只允许一个开机请求，成功后 cooldown 秒内不再重复开机
+
+    开机失败（余额不足、实例不存在等）后等待 failure_cooldown 秒才允许再次
+    尝试，连续失败时等待时间逐次翻倍，最长 max_failure_cooldown 秒，
+    避免每次检查都重复发送注定失败的请求。
+    """
+
+    def __init__(
+        self, cooldown=60.0, failure_cooldown=30.0, max_failure_cooldown=600.0
+    ):
+        self.cooldown = cooldown
+        self.failure_cooldown = failure_cooldown
+        self.max_failure_cooldown = max_failure_cooldown
+        self.in_flight = set()
+        self.last_success = {}
+        # instance_uuid -> (连续失败次数, 最近一次失败的时刻)
+        self.failures = {}
+
+    def retry_at(self, instance_uuid):
+        """最近一次失败后允许再次开机的时刻，没有失败记录时返回 None"""
+        failure = self.failures.get(instance_uuid)
+        if failure is None:
+            return None
+        count, failed_at = failure
+        delay = self.failure_cooldown * 2 ** (count - 1)
+        return failed_at + min(delay, self.max_failure_cooldown)
+
+    def acquire(self, instance_uuid, now=None):
+        now = time.monotonic() if now is None else now
+        if instance_uuid in self.in_flight:
+            return False
+        last = self.last_success.get(instance_uuid)
+        if last is not None and now - last < self.cooldown:
+            return False
+        retry_at = self.retry_at(instance_uuid)
+        if retry_at is not None and now < retry_at:
+            return False
+        self.in_flight.add(instance_uuid)
+        return True
+
+    def release(self, instance_uuid, success, now=None, penalize=True):
+        """penalize 为 False 的失败（空闲卡被抢走）不计入失败退避"""
+        now = time.monotonic() if now is None else now
+        self.in_flight.discard(instance_uuid)
+        if success:
+            self.last_success[instance_uuid] = now
+            self.failures.pop(instance_uuid, None)
+        elif penalize:
+            count = self.failures.get(instance_uuid, (0, None))[0]
+            self.failures[instance_uuid] = (count + 1, now)
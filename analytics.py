@@ -0,0 +1,123 @@
+import time
+
+import numpy as np
+
+HOURS_PER_WEEK = 7 * 24
+# 1970-01-01 是星期四，加 3 天后按小时取模即为从周一 0 点开始的小时序号
+EPOCH_WEEKDAY_HOURS = 3 * 24
+
+
+def hour_of_week(ts, utc_offset=0):
+    """时间戳数组 -> 从周一 0 点起的小时序号 (0~167)"""
+    return ((ts + utc_offset) // 3600 + EPOCH_WEEKDAY_HOURS) % HOURS_PER_WEEK
+
+
+def local_utc_offset():
+    return -time.altzone if time.localtime().tm_isdst > 0 else -time.timezone
+
+
+def unique_sorted(values):
+    """对已排序数组去重，相邻比较即可，比 np.unique 省去一次排序"""
+    if len(values) == 0:
+        return values
+    return values[np.concatenate(([True], values[1:] != values[:-1]))]
+
+
+def availability_stats(ts, idle, threshold, now=None, max_gap=600, utc_offset=0):
+    """对单台机器的历史样本计算可用性统计，全部为向量化运算
+
+    ts、idle 为按时间排序的数组；max_gap 秒以上的采样间隔视为没有数据，
+    不计入时长。返回 None 表示没有足够的样本。
+    """
+    if len(ts) < 2:
+        return None
+    now = time.time() if now is None else now
+    available = idle >= threshold
+
+    # 每个样本代表到下一个样本之间的时间
+    dt = np.minimum(np.diff(ts), max_gap)
+    covered = dt.sum()
+    ratio = float(dt[available[:-1]].sum() / covered) if covered else 0.0
+
+    # 空闲窗口：available 连续为真的区间
+    edges = np.diff(available.astype(np.int8))
+    starts = np.flatnonzero(edges == 1) + 1
+    ends = np.flatnonzero(edges == -1) + 1
+    if available[0]:
+        starts = np.concatenate(([0], starts))
+    if available[-1]:
+        ends = np.concatenate((ends, [len(ts) - 1]))
+    durations = ts[ends] - ts[starts]
+    mean_window = float(durations.mean()) if len(durations) else 0.0
+
+    # 由不可用变为可用的时刻落在一周中的哪个小时
+    if len(starts):
+        freed = np.bincount(
+            hour_of_week(ts[starts], utc_offset), minlength=HOURS_PER_WEEK
+        )
+        peak_hour = int(freed.argmax())
+    else:
+        peak_hour = None
+
+    # 下一小时的概率：历史上同一个星期几、同一小时中出现过可用的比例
+    hours = ts // 3600
+    observed = unique_sorted(hours)
+    free_hours = unique_sorted(hours[available])
+    observed_count = np.bincount(
+        hour_of_week(observed * 3600, utc_offset), minlength=HOURS_PER_WEEK
+    )
+    free_count = np.bincount(
+        hour_of_week(free_hours * 3600, utc_offset), minlength=HOURS_PER_WEEK
+    )
+    next_hour = int(hour_of_week(np.int64(now) + 3600, utc_offset))
+    if observed_count[next_hour]:
+        forecast = float(free_count[next_hour] / observed_count[next_hour])
+    else:
+        forecast = None
+
+    return {
+        "ratio": ratio,
+        "peak_hour": peak_hour,
+        "mean_window": mean_window,
+        "forecast": forecast,
+    }
+
+
+class AvailabilityAnalyzer:
+    """在内存中缓存各机器的历史数组，每次刷新只从历史库读取新增样本"""
+
+    def __init__(self, history, days=30):
+        self.history = history
+        self.days = days
+        self.series = {}
+
+    def load(self, machine_id):
+        ts, idle = self.series.get(
+            machine_id, (np.empty(0, np.int64), np.empty(0, np.int16))
+        )
+        since = time.time() - self.days * 86400
+        last = int(ts[-1]) if len(ts) else int(since) - 1
+        rows = self.history.idle_samples(machine_id, last + 1)
+        if rows:
+            new = np.array(rows, dtype=np.int64)
+            ts = np.concatenate((ts, new[:, 0]))
+            idle = np.concatenate((idle, new[:, 1].astype(np.int16)))
+        # 丢弃超出统计窗口的旧样本
+        keep = np.searchsorted(ts, since)
+        ts, idle = ts[keep:], idle[keep:]
+        self.series[machine_id] = (ts, idle)
+        return ts, idle
+
+    def stats(self, machine_ids, threshold):
+        """返回 {machine_id: 统计结果}，应在后台线程中调用"""
+        now = time.time()
+        offset = local_utc_offset()
+        for machine_id in set(self.series) - set(machine_ids):
+            del self.series[machine_id]
+        result = {}
+        for machine_id in machine_ids:
+            ts, idle = self.load(machine_id)
+            stats = availability_stats(ts, idle, threshold, now, utc_offset=offset)
+            if stats is not None:
+                result[machine_id] = stats
+        return result
@@ -0,0 +1,181 @@
+import hashlib
+import json
+import os
+import threading
+
+import requests
+
+try:
+    # 可选依赖：安装后凭据保存在系统的凭据管理器中
+    import keyring
+except ImportError:
+    keyring = None
+
+LOGIN_URL = "https://www.autodl.com/api/v1/new_login"
+# 注意私有云和公有云使用不同的接口
+PASSPORT_URL = "https://private.autodl.com/api/v2/login"
+
+KEYRING_SERVICE = "autodl-watcher"
+
+# API 以这些 code 表示 token 无效或已过期
+AUTH_FAILURE_CODES = {
+    "AuthorizeFailed",
+    "Unauthorized",
+    "TokenExpired",
+    "InvalidToken",
+    "LoginRequired",
+}
+
+
+class LoginError(Exception):
+    """登录接口返回了错误（账号密码错误等），消息为接口返回的 msg"""
+
+
+def hash_password(password):
+    # 接口要求使用 SHA1 对密码进行散列
+    return hashlib.sha1(password.encode()).hexdigest()
+
+
+def is_auth_failure(result):
+    return (
+        result.get("status") in (401, 403) or result.get("code") in AUTH_FAILURE_CODES
+    )
+
+
+class AuthSession:
+    """登录流程（ticket -> token）共用一个 Session，并可缓存凭据用于自动重新登录
+
+    登录接口直接接受密码的 SHA1 摘要，摘要与密码本身同样敏感。安装了 keyring
+    时摘要保存在系统的凭据管理器中，缓存文件只记录手机号；否则摘要以明文
+    保存在缓存文件中，仅在 POSIX 系统上限制为当前用户可读写。
+    """
+
+    def __init__(
+        self,
+        credentials_path="credentials.json",
+        login_url=LOGIN_URL,
+        passport_url=PASSPORT_URL,
+        timeout=10,
+        keyring=keyring,
+    ):
+        self.credentials_path = credentials_path
+        self.keyring = keyring
+        self.login_url = login_url
+        self.passport_url = passport_url
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.phone = None
+        self.hashed_password = None
+        self.lock = threading.Lock()
+        self._listeners = []
+
+    def on_refresh(self, callback):
+        """注册重新登录成功后的回调，参数为新的 token"""
+        self._listeners.append(callback)
+
+    def _post(self, url, payload):
+        resp = self.session.post(url, json=payload, timeout=self.timeout)
+        data = resp.json()
+        if data.get("code") != "Success":
+            raise LoginError(data.get("msg", "未知错误"))
+        return data["data"]
+
+    def login(self, phone, password, remember=False):
+        """使用明文密码登录，返回 token；失败时抛出 LoginError 或 requests 异常"""
+        return self.login_hashed(phone, hash_password(password), remember)
+
+    def login_hashed(self, phone, hashed_password, remember=False):
+        # 界面线程和引擎的重新登录可能同时使用同一个 Session
+        with self.lock:
+            token = self._login(phone, hashed_password)
+        self.phone = phone
+        self.hashed_password = hashed_password
+        if remember:
+            self.save_credentials()
+        return token
+
+    def _login(self, phone, hashed_password):
+        # 第一个请求: 获取 ticket
+        login_payload = {
+            "phone": phone,
+            "password": hashed_password,
+            "v_code": "",
+            "phone_area": "+86",
+            "picture_id": None,
+        }
+        try:
+            ticket = self._post(self.login_url, login_payload)["ticket"]
+            # 第二个请求: 使用 ticket 获取 token
+            passport_payload = {"ticket": ticket, "third_party_login": False}
+            return self._post(self.passport_url, passport_payload)["token"]
+        except (AttributeError, KeyError, TypeError) as e:
+            # 响应缺少 ticket/token 或结构不对，与接口报错一样按登录失败处理
+            raise LoginError(f"登录接口返回格式错误: {e!r}") from e
+
+    def relogin(self):
+        """使用已知凭据重新登录，返回新 token，没有凭据或失败时返回 None"""
+        if not self.phone and not self.load_credentials():
+            return None
+        try:
+            token = self.login_hashed(self.phone, self.hashed_password)
+        except (LoginError, requests.RequestException, ValueError):
+            return None
+        for callback in self._listeners:
+            callback(token)
+        return token
+
+    def save_credentials(self):
+        """保存凭据，返回是否保存在系统的凭据管理器中"""
+        data = {"phone": self.phone}
+        in_keyring, _ = self._keyring_call(
+            "set_password", KEYRING_SERVICE, self.phone, self.hashed_password
+        )
+        if in_keyring:
+            data["keyring"] = True
+        else:
+            data["password"] = self.hashed_password
+        try:
+            fd = os.open(
+                self.credentials_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600
+            )
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            # 文件已存在时 os.open 不会修改权限
+            os.chmod(self.credentials_path, 0o600)
+        except OSError:
+            pass
+        return in_keyring
+
+    def load_credentials(self):
+        try:
+            with open(self.credentials_path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        self.phone = data.get("phone")
+        self.hashed_password = data.get("password")
+        if self.phone and data.get("keyring"):
+            _, self.hashed_password = self._keyring_call(
+                "get_password", KEYRING_SERVICE, self.phone
+            )
+        return bool(self.phone and self.hashed_password)
+
+    def forget_credentials(self):
+        if self.phone:
+            self._keyring_call("delete_password", KEYRING_SERVICE, self.phone)
+        self.phone = None
+        self.hashed_password = None
+        try:
+            os.remove(self.credentials_path)
+        except OSError:
+            pass
+
+    def _keyring_call(self, name, *args):
+        """调用 keyring 的函数，返回 (是否调用成功, 返回值)"""
+        if self.keyring is None:
+            return False, None
+        try:
+            return True, getattr(self.keyring, name)(*args)
+        except Exception:
+            # 没有可用后端（无桌面环境的 Linux）、条目不存在等都按不可用处理
+            return False, None
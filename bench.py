@@ -0,0 +1,288 @@
+"""针对 mock_server.py 的端到端性能测试
+
+    python bench.py                      # 全部测试
+    python bench.py scaling --sizes 10 1000 10000
+    python bench.py latency --trials 50 --interval 0.5
+
+scaling: 不同机器数量下每次检查的耗时、CPU 时间、内存峰值和请求数
+latency: 空闲GPU出现到服务端收到开机请求的延迟分位数
+
+模拟服务运行在单独的进程中，CPU 时间只统计监控引擎本身。
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import requests
+
+from engine import SCOPE_ALL, SCOPE_MONITORED, AutoDLClient, Watcher, is_success
+from snipe import percentile
+
+MOCK_SERVER = Path(__file__).with_name("mock_server.py")
+
+
+class MockProcess:
+    """在子进程中启动 mock_server.py，并通过 /mock/* 接口控制"""
+
+    def __init__(self, machines, latency=0.0, jitter=0.0, error_rate=0.0):
+        command = [
+            sys.executable,
+            str(MOCK_SERVER),
+            "--port", "0",
+            "--machines", str(machines),
+            "--latency", str(latency),
+            "--jitter", str(jitter),
+            "--error-rate", str(error_rate),
+        ]
+        self.process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+        self.url = self.process.stdout.readline().strip()
+        if not self.url:
+            raise RuntimeError("mock_server.py 启动失败")
+        self.session = requests.Session()
+
+    def control(self, path, payload=None):
+        return self.session.post(self.url + path, json=payload or {}, timeout=10).json()
+
+    def stats(self):
+        return self.session.get(self.url + "/mock/stats", timeout=10).json()
+
+    def request_count(self):
+        return sum(self.stats()["requests"].values())
+
+    def close(self):
+        self.session.close()
+        self.process.terminate()
+        self.process.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def make_watcher(url, scope, monitored=(), **options):
+    # 压测时不限速，只测量引擎本身
+    client = AutoDLClient("bench", base_url=url, rate_limit=10000)
+    watcher = Watcher(client, scope=scope, **options)
+    watcher.monitored_machines.update(monitored)
+    return watcher
+
+
+async def warm_up(watcher):
+    # 第一次检查会建立页码索引，不计入
+    result = await watcher.check_status()
+    if not is_success(result):
+        raise RuntimeError(f"检查失败: {result}")
+
+
+async def measure_polls(watcher, polls):
+    """返回 (每次检查的耗时列表, 总 CPU 时间)"""
+    durations = []
+    cpu_started = time.process_time()
+    for _ in range(polls):
+        started = time.perf_counter()
+        await watcher.check_status()
+        durations.append(time.perf_counter() - started)
+    return durations, time.process_time() - cpu_started
+
+
+async def measure_memory(watcher):
+    """单次检查期间的 Python 内存分配峰值（字节）"""
+    tracemalloc.start()
+    try:
+        await watcher.check_status()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+async def bench_scope(mock, size, scope, polls, page_size, concurrency):
+    monitored = random.Random(size).sample(
+        [f"m-{i:04d}" for i in range(size)], min(5, size)
+    )
+    watcher = make_watcher(
+        mock.url,
+        scope,
+        monitored,
+        catalog_page_size=page_size,
+        max_concurrency=concurrency,
+    )
+    try:
+        await warm_up(watcher)
+        before = mock.request_count()
+        durations, cpu = await measure_polls(watcher, polls)
+        requests_per_poll = (mock.request_count() - before) / polls
+        peak = await measure_memory(watcher)
+    finally:
+        watcher.client.close()
+    durations.sort()
+    return {
+        "machines": size,
+        "scope": scope,
+        "polls_per_sec": len(durations) / sum(durations),
+        "p50_ms": percentile(durations, 50) * 1000,
+        "p90_ms": percentile(durations, 90) * 1000,
+        "cpu_ms_per_poll": cpu / len(durations) * 1000,
+        "peak_kib": peak / 1024,
+        "requests_per_poll": requests_per_poll,
+    }
+
+
+def bench_scaling(args):
+    rows = []
+    for size in args.sizes:
+        with MockProcess(size, latency=args.latency) as mock:
+            for scope in (SCOPE_ALL, SCOPE_MONITORED):
+                rows.append(
+                    asyncio.run(
+                        bench_scope(
+                            mock,
+                            size,
+                            scope,
+                            args.polls,
+                            args.page_size,
+                            args.concurrency,
+                        )
+                    )
+                )
+                print_row(rows[-1])
+    return rows
+
+
+def print_row(row):
+    print(
+        f"{row['machines']:>6} {row['scope']:<9} "
+        f"{row['polls_per_sec']:8.1f} 次/秒  "
+        f"p50 {row['p50_ms']:7.2f}ms  p90 {row['p90_ms']:7.2f}ms  "
+        f"CPU {row['cpu_ms_per_poll']:7.2f}ms/次  "
+        f"内存峰值 {row['peak_kib']:8.1f}KiB  "
+        f"{row['requests_per_poll']:.1f} 请求/次"
+    )
+
+
+async def run_latency(mock, args):
+    machine_id = "m-0000"
+    instance_uuid = f"{machine_id}-i0"
+    watcher = make_watcher(
+        mock.url, SCOPE_MONITORED, interval=args.interval, catalog_page_size=20
+    )
+    # 每轮测试都会重新开机同一个实例
+    watcher.power_on_guard.cooldown = 0
+    watcher.power_on_guard.failure_cooldown = 0
+    watcher.scheduler.jitter = 0
+    watcher.arm([instance_uuid])
+    await watcher.refresh_instances()
+    watcher.start()
+
+    latencies = []
+    try:
+        for _ in range(args.trials):
+            # 等上一轮的开机确认结束：实例运行后会被取消自动开机
+            while instance_uuid in watcher.confirm:
+                await asyncio.sleep(0.01)
+            await asyncio.to_thread(mock.control, "/mock/reset")
+            # 重新勾选自动开机，并刷新实例状态（上一轮结束时为运行）
+            watcher.arm([instance_uuid])
+            await watcher.refresh_instances()
+            # 让空闲卡出现在两次检查之间的任意时刻
+            await asyncio.sleep(args.interval + random.uniform(0, args.interval))
+            await asyncio.to_thread(
+                mock.control, "/mock/idle", {"machine_id": machine_id, "idle": 1}
+            )
+            deadline = time.monotonic() + args.interval * 4 + 5
+            while time.monotonic() < deadline:
+                stats = await asyncio.to_thread(mock.stats)
+                event = stats["events"][-1]
+                fired = [
+                    p
+                    for p in stats["power_ons"]
+                    if p["success"] and p["at"] >= event["at"]
+                ]
+                if fired:
+                    latencies.append(fired[0]["at"] - event["at"])
+                    break
+                await asyncio.sleep(0.01)
+    finally:
+        watcher.stop()
+        watcher.client.close()
+    return latencies, list(watcher.sniper.stats.records)
+
+
+def bench_latency(args):
+    with MockProcess(args.machines, latency=args.latency) as mock:
+        latencies, records = asyncio.run(run_latency(mock, args))
+    latencies.sort()
+    detect = sorted(r["detect_to_request"] for r in records)
+    ack = sorted(r["request_to_ack"] for r in records)
+    row = {
+        "machines": args.machines,
+        "interval": args.interval,
+        "trials": args.trials,
+        "detected": len(latencies),
+    }
+    for name, values in (
+        ("event_to_power_on", latencies),
+        ("detect_to_request", detect),
+        ("request_to_ack", ack),
+    ):
+        for q in (50, 90, 99):
+            value = percentile(values, q)
+            row[f"{name}_p{q}_ms"] = None if value is None else value * 1000
+    print(
+        f"检查间隔 {args.interval}s，{row['detected']}/{args.trials} 次成功开机"
+    )
+    for name in ("event_to_power_on", "detect_to_request", "request_to_ack"):
+        values = [row[f"{name}_p{q}_ms"] for q in (50, 90, 99)]
+        if values[0] is None:
+            continue
+        print(
+            f"  {name:<18} p50 {values[0]:8.2f}ms  "
+            f"p90 {values[1]:8.2f}ms  p99 {values[2]:8.2f}ms"
+        )
+    return row
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="监控引擎性能测试")
+    parser.add_argument(
+        "suite", nargs="?", choices=["all", "scaling", "latency"], default="all"
+    )
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000],
+        help="scaling 测试的机器数量",
+    )
+    parser.add_argument("--polls", type=int, default=20, help="每组测量的检查次数")
+    parser.add_argument("--page-size", type=int, default=20, help="全量拉取时的每页机器数")
+    parser.add_argument("--concurrency", type=int, default=4, help="多页检查时的最大并发请求数")
+    parser.add_argument("--latency", type=float, default=0.0, help="模拟服务每个请求的延迟（秒）")
+    parser.add_argument("--machines", type=int, default=1000, help="latency 测试的机器数量")
+    parser.add_argument("--interval", type=float, default=0.5, help="latency 测试的检查间隔（秒）")
+    parser.add_argument("--trials", type=int, default=20, help="latency 测试的次数")
+    parser.add_argument("--json", default=None, help="把结果写入 JSON 文件")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    results = {}
+    if args.suite in ("all", "scaling"):
+        print("== scaling ==")
+        results["scaling"] = bench_scaling(args)
+    if args.suite in ("all", "latency"):
+        print("== latency ==")
+        results["latency"] = bench_latency(args)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
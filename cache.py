@@ -0,0 +1,36 @@
+import json
+import os
+
+from records import Machine
+
+
+class SnapshotCache:
+    """保存最近一次的机器列表、实例列表和监控设置，启动时先显示再后台刷新
+
+    机器按 records.Machine 构造参数的顺序保存为列表，实例保存 API 返回的原始字段。
+    """
+
+    def __init__(self, path="snapshot.json"):
+        self.path = path
+
+    def load(self):
+        """返回缓存内容，没有缓存或文件损坏时返回 None"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            data["machines"] = [Machine(*row) for row in data.get("machines", [])]
+        except (OSError, ValueError, TypeError):
+            return None
+        return data
+
+    def save(self, **data):
+        """写入临时文件后替换，保存中途退出不会留下损坏的缓存"""
+        machines = data.get("machines") or []
+        data["machines"] = [m.fields() for m in machines]
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except (OSError, TypeError, ValueError):
+            pass
@@ -0,0 +1,143 @@
+from operator import attrgetter
+
+
+def trigrams(text):
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class Catalog:
+    """全部机器的本地目录，按型号、状态和名称建立索引，筛选和排序不需要请求网络
+
+    replace 用全量快照重建，update 用部分快照（如只拉取了被监控机器所在的页）
+    更新其中的机器。名称搜索使用三字符片段索引，短于三个字符时顺序扫描。
+    """
+
+    # 可排序的字段
+    SORT_KEYS = (
+        "machine_id",
+        "machine_name",
+        "gpu_name",
+        "gpu_total",
+        "gpu_idle",
+        "status",
+    )
+
+    def __init__(self):
+        self.machines = {}
+        # 机器ID -> 在目录中的位置，未排序时按此顺序显示
+        self.position = {}
+        self.by_gpu = {}
+        self.by_status = {}
+        self.by_trigram = {}
+        self.search_text = {}
+
+    def __len__(self):
+        return len(self.machines)
+
+    def __iter__(self):
+        return iter(self.machines.values())
+
+    def get(self, machine_id):
+        return self.machines.get(machine_id)
+
+    def gpu_names(self):
+        return sorted(self.by_gpu)
+
+    def replace(self, machines):
+        self.machines = {}
+        self.position = {}
+        self.by_gpu = {}
+        self.by_status = {}
+        self.by_trigram = {}
+        self.search_text = {}
+        self.update(machines)
+
+    def update(self, machines):
+        for machine in machines:
+            machine_id = machine.machine_id
+            old = self.machines.get(machine_id)
+            if old is None:
+                self.position[machine_id] = len(self.position)
+                self._index_name(machine)
+            elif old.machine_name != machine.machine_name:
+                self._unindex_name(old)
+                self._index_name(machine)
+            if old is None or old.gpu_name != machine.gpu_name:
+                if old is not None:
+                    self._discard(self.by_gpu, old.gpu_name, machine_id)
+                self.by_gpu.setdefault(machine.gpu_name, set()).add(machine_id)
+            if old is None or old.status != machine.status:
+                if old is not None:
+                    self._discard(self.by_status, old.status, machine_id)
+                self.by_status.setdefault(machine.status, set()).add(machine_id)
+            self.machines[machine_id] = machine
+
+    def _discard(self, index, key, machine_id):
+        ids = index.get(key)
+        if ids is not None:
+            ids.discard(machine_id)
+            if not ids:
+                del index[key]
+
+    def _index_name(self, machine):
+        # 按名称和机器ID搜索，不区分大小写
+        text = f"{machine.machine_name}\n{machine.machine_id}".lower()
+        self.search_text[machine.machine_id] = text
+        for gram in trigrams(text):
+            self.by_trigram.setdefault(gram, set()).add(machine.machine_id)
+
+    def _unindex_name(self, machine):
+        text = self.search_text.pop(machine.machine_id, "")
+        for gram in trigrams(text):
+            self._discard(self.by_trigram, gram, machine.machine_id)
+
+    def search(self, text):
+        """名称或机器ID包含 text 的机器ID集合"""
+        text = text.lower()
+        grams = trigrams(text)
+        if grams:
+            candidates = None
+            for gram in sorted(grams, key=lambda g: len(self.by_trigram.get(g, ()))):
+                ids = self.by_trigram.get(gram)
+                if not ids:
+                    return set()
+                candidates = set(ids) if candidates is None else candidates & ids
+        else:
+            candidates = self.search_text.keys()
+        return {i for i in candidates if text in self.search_text[i]}
+
+    def query(
+        self,
+        text="",
+        gpu_name=None,
+        status=None,
+        min_idle=0,
+        machine_ids=None,
+        sort_key=None,
+        descending=False,
+    ):
+        """返回满足全部条件的机器列表，未指定 sort_key 时按目录顺序"""
+        candidates = None
+        for ids in (
+            self.by_gpu.get(gpu_name, set()) if gpu_name else None,
+            self.by_status.get(status, set()) if status else None,
+            machine_ids,
+            self.search(text) if text else None,
+        ):
+            if ids is None:
+                continue
+            candidates = set(ids) if candidates is None else candidates & set(ids)
+
+        if candidates is None:
+            machines = list(self.machines.values())
+        else:
+            machines = [self.machines[i] for i in candidates if i in self.machines]
+            if sort_key is None:
+                machines.sort(key=lambda m: self.position[m.machine_id])
+        if min_idle:
+            machines = [m for m in machines if m.gpu_idle >= min_idle]
+        if sort_key is not None:
+            machines.sort(key=attrgetter(sort_key), reverse=descending)
+        elif descending:
+            machines.reverse()
+        return machines
@@ -0,0 +1,36 @@
+import time
+
+
+def combine(fingerprints):
+    """把多页的指纹合成一个，任一页缺少指纹时返回 None（视为总有变化）"""
+    fingerprints = tuple(fingerprints)
+    if any(f is None for f in fingerprints):
+        return None
+    return hash(fingerprints)
+
+
+class ChangeDetector:
+    """判断一次检查的输入与上次相比是否有变化
+
+    key 由快照指纹和影响处理结果的设置组成，相同时可以跳过规则评估、
+    历史写入和界面刷新。为了让历史数据不出现过长的空档（统计时超过
+    analytics.availability_stats 的 max_gap 视为没有数据），没有变化时
+    每隔 heartbeat 秒仍放行一次。
+    """
+
+    def __init__(self, heartbeat=300.0):
+        self.heartbeat = heartbeat
+        self.last_key = None
+        self.passed_at = 0.0
+
+    def changed(self, key, now=None):
+        now = time.monotonic() if now is None else now
+        if key is not None and key == self.last_key:
+            if now - self.passed_at < self.heartbeat:
+                return False
+        self.last_key = key
+        self.passed_at = now
+        return True
+
+    def reset(self):
+        self.last_key = None
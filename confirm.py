@@ -0,0 +1,92 @@
+import metrics
+
+RUNNING = "running"
+SHUTDOWN = "shutdown"
+
+
+class PowerOnTracker:
+    """开机请求成功后跟踪实例状态，直到变为 running 或确认失败
+
+    接口返回成功只表示请求已受理，实例仍可能没有启动。开机后先密集查询，
+    之后按 backoff 倍数放缓到 max_delay，启动慢的实例不会占用太多请求配额。
+    实例已进入其它状态后又回到关机，或开机 grace 秒后仍是关机，或超过
+    timeout 秒仍未运行，都视为失败。时间按 watcher.clock 计算，等待使用
+    watcher.sleep，回放时与检查使用同一时间线。
+    """
+
+    def __init__(
+        self,
+        watcher,
+        first_delay=0.5,
+        max_delay=10.0,
+        backoff=2.0,
+        grace=30.0,
+        timeout=300.0,
+    ):
+        self.watcher = watcher
+        self.first_delay = first_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.grace = grace
+        self.timeout = timeout
+        self.tasks = {}
+
+    def __contains__(self, instance_uuid):
+        task = self.tasks.get(instance_uuid)
+        return task is not None and not task.done()
+
+    def track(self, instance_uuid, source):
+        """开始跟踪，同一实例已在跟踪时沿用原来的任务"""
+        if instance_uuid in self:
+            return self.tasks[instance_uuid]
+        task = self.watcher.spawn(self.follow(instance_uuid, source))
+        self.tasks[instance_uuid] = task
+        task.add_done_callback(lambda _: self._forget(instance_uuid, task))
+        return task
+
+    def _forget(self, instance_uuid, task):
+        if self.tasks.get(instance_uuid) is task:
+            del self.tasks[instance_uuid]
+
+    async def follow(self, instance_uuid, source):
+        clock = self.watcher.clock
+        started = clock()
+        delay = self.first_delay
+        polls = 0
+        status = None
+        left_shutdown = False
+        while True:
+            await self.watcher.sleep(delay)
+            instance = await self.watcher.lookup_instance(instance_uuid)
+            polls += 1
+            elapsed = clock() - started
+            if instance is not None:
+                status = instance.get("status")
+                if status == RUNNING:
+                    success = True
+                    break
+                if status == SHUTDOWN:
+                    if left_shutdown or elapsed >= self.grace:
+                        success = False
+                        break
+                else:
+                    left_shutdown = True
+            if elapsed >= self.timeout:
+                success = False
+                break
+            delay = min(delay * self.backoff, self.max_delay)
+
+        result = "success" if success else "failure"
+        metrics.STARTUPS.inc(source=source, result=result)
+        if success:
+            metrics.STARTUP_SECONDS.observe(elapsed)
+        record = {
+            "instance_uuid": instance_uuid,
+            "source": source,
+            "success": success,
+            "status": status,
+            "seconds": elapsed,
+            "polls": polls,
+        }
+        self.watcher.finish_startup(record)
+        return record
@@ -0,0 +1,284 @@
+"""无界面运行监控，适合在没有显示器的 Linux 服务器上使用
+
+示例:
+    python daemon.py --machine <机器ID> --threshold 2 --interval 5
+"""
+
+import argparse
+import asyncio
+import getpass
+
+from accounts import MultiWatcher, load_accounts
+from auth import AuthSession, LoginError
+from engine import (
+    SCOPE_ALL,
+    SCOPE_MONITORED,
+    SCOPE_PAGE,
+    AutoDLClient,
+    Watcher,
+    load_token,
+    save_token,
+)
+from history import HistoryStore
+from metrics import MetricsLog, MetricsServer
+from notify import Notifier, NotifyError, parse_sink
+from recorder import Recorder
+from rules import ACTION_NOTIFY, load_rules
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="AutoDL Watcher 后台监控")
+    parser.add_argument("--token", default="", help="Authorization Token")
+    parser.add_argument(
+        "--token-file", default="token.txt", help="未指定 --token 时从该文件读取"
+    )
+    parser.add_argument(
+        "--machine",
+        action="append",
+        default=[],
+        help="要监控的机器ID，可重复指定",
+    )
+    parser.add_argument(
+        "--instance",
+        action="append",
+        default=[],
+        help="所在机器有空闲卡时自动开机的实例ID，可重复指定",
+    )
+    parser.add_argument("--threshold", type=int, default=1, help="空闲GPU阈值")
+    parser.add_argument("--interval", type=float, default=5, help="检查间隔（秒）")
+    parser.add_argument("--page-size", type=int, default=4)
+    parser.add_argument(
+        "--scope",
+        choices=[SCOPE_PAGE, SCOPE_ALL, SCOPE_MONITORED],
+        default=SCOPE_MONITORED,
+        help="检查范围：第一页 / 全部页 / 仅被监控机器所在的页",
+    )
+    parser.add_argument("--concurrency", type=int, default=4, help="多页检查时的最大并发请求数")
+    parser.add_argument("--rate-limit", type=float, default=10, help="每秒最多发送的请求数")
+    parser.add_argument(
+        "--credentials",
+        default="credentials.json",
+        help="缓存的登录凭据，token 过期时用于自动重新登录",
+    )
+    parser.add_argument(
+        "--login",
+        action="store_true",
+        help="交互式登录，保存 token 和凭据后退出",
+    )
+    parser.add_argument(
+        "--accounts",
+        default=None,
+        help="多账号配置文件（JSON），指定后忽略 --token/--machine/--instance",
+    )
+    parser.add_argument("--rules", default=None, help="监控规则文件（JSON），格式见 rules.py")
+    parser.add_argument(
+        "--history", default="history.db", help="GPU 空闲历史数据库路径，为空时不记录"
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        help="在 127.0.0.1 的该端口上提供 Prometheus 格式的 /metrics",
+    )
+    parser.add_argument("--metrics-log", default=None, help="定期写入指标汇总的日志文件（按大小滚动）")
+    parser.add_argument("--metrics-log-interval", type=float, default=60, help="写入指标日志的间隔（秒）")
+    parser.add_argument(
+        "--notify",
+        action="append",
+        default=[],
+        help="通知渠道，可重复指定: stdout / log:路径 / webhook:URL / smtp:收件人 / desktop，"
+        "默认 stdout",
+    )
+    parser.add_argument("--smtp-server", default="localhost:25", help="smtp 渠道使用的 SMTP 服务器")
+    parser.add_argument(
+        "--record",
+        default=None,
+        help="把每个请求和响应追加写入该文件（gzip 压缩的 JSON 行），可用 replay.py 回放",
+    )
+    return parser.parse_args()
+
+
+def account_prefix(name):
+    return f"[{name}] " if name else ""
+
+
+def subscribe_output(watcher, notifier, name=""):
+    prefix = account_prefix(name)
+    # 空闲GPU和通知类规则经通知管道合并后发出
+    notifier.attach(watcher, name)
+
+    def on_error(result):
+        message = result.get("error") or result.get("msg", "未知错误")
+        print(f"{prefix}检查失败: {message}", flush=True)
+
+    def on_power_on(instance_uuid, result):
+        if "error" in result or result.get("code") != "Success":
+            message = result.get("error") or result.get("msg")
+            print(f"{prefix}实例 {instance_uuid} 开机失败: {message}", flush=True)
+        else:
+            print(f"{prefix}实例 {instance_uuid} 已发送开机请求", flush=True)
+
+    def on_snipe(record):
+        print(
+            f"{prefix}检测→请求 {record['detect_to_request'] * 1000:.0f}ms，"
+            f"请求→响应 {record['request_to_ack'] * 1000:.0f}ms，"
+            f"共尝试 {record['attempts']} 次",
+            flush=True,
+        )
+
+    def on_startup(record):
+        instance_uuid = record["instance_uuid"]
+        if record["success"]:
+            print(
+                f"{prefix}实例 {instance_uuid} 已运行，开机耗时 {record['seconds']:.1f} 秒",
+                flush=True,
+            )
+        else:
+            print(
+                f"{prefix}实例 {instance_uuid} 开机后未能运行（状态: {record['status']}）",
+                flush=True,
+            )
+
+    def on_rule(rule, machines):
+        if rule.action[0] == ACTION_NOTIFY:
+            return
+        names = "、".join(machine.machine_name for machine in machines)
+        print(f"{prefix}规则「{rule.name}」触发: {names}", flush=True)
+
+    watcher.subscribe("rule", on_rule)
+    watcher.subscribe("power_on", on_power_on)
+    watcher.subscribe("error", on_error)
+    watcher.subscribe("snipe", on_snipe)
+    watcher.subscribe("startup", on_startup)
+
+
+def build_notifier(args):
+    host, _, port = args.smtp_server.partition(":")
+    try:
+        sinks = [
+            parse_sink(spec, smtp_host=host, smtp_port=int(port or 25))
+            for spec in args.notify or ["stdout"]
+        ]
+    except (NotifyError, OSError, ValueError) as e:
+        raise SystemExit(f"通知渠道配置错误: {e}")
+    return Notifier(sinks)
+
+
+def build_multi_watcher(args, client, notifier):
+    runner = MultiWatcher(
+        client,
+        interval=args.interval,
+        scope=args.scope,
+        page_size=args.page_size,
+        max_concurrency=args.concurrency,
+    )
+    for i, config in enumerate(load_accounts(args.accounts)):
+        account = runner.add_account(
+            config.get("name") or f"账号{i + 1}",
+            config["token"],
+            machines=config.get("machines", []),
+            instances=config.get("instances", []),
+            threshold=config.get("threshold", args.threshold),
+        )
+        if config.get("rules"):
+            account.watcher.rules = read_rules(config["rules"])
+        subscribe_output(account.watcher, notifier, account.name)
+    return runner
+
+
+def build_watcher(args, client, notifier):
+    watcher = Watcher(
+        client,
+        interval=args.interval,
+        threshold=args.threshold,
+        page_size=args.page_size,
+        scope=args.scope,
+        max_concurrency=args.concurrency,
+    )
+    watcher.monitored_machines.update(args.machine)
+    watcher.arm(args.instance)
+    if args.rules:
+        watcher.rules = read_rules(args.rules)
+    subscribe_output(watcher, notifier)
+    return watcher
+
+
+def read_rules(path):
+    try:
+        return load_rules(path)
+    except (OSError, ValueError) as e:
+        raise SystemExit(f"读取规则文件 {path} 失败: {e}")
+
+
+def login(args):
+    auth = AuthSession(args.credentials)
+    phone = input("账号: ").strip()
+    password = getpass.getpass("密码: ")
+    try:
+        token = auth.login(phone, password)
+    except LoginError as e:
+        raise SystemExit(f"登录失败: {e}")
+    save_token(token, args.token_file)
+    print(f"登录成功，token 已保存到 {args.token_file}")
+    if auth.save_credentials():
+        print("凭据已保存到系统凭据管理器")
+    else:
+        print(
+            f"凭据以明文保存在 {args.credentials}，其中的密码摘要可直接用于登录，"
+            "请像密码一样保护该文件（安装 keyring 后改为保存到系统凭据管理器）"
+        )
+
+
+async def main():
+    args = parse_args()
+    if args.login:
+        login(args)
+        return
+    notifier = build_notifier(args)
+    if args.accounts:
+        client = AutoDLClient(rate_limit=args.rate_limit)
+        runner = build_multi_watcher(args, client, notifier)
+    else:
+        auth = AuthSession(args.credentials)
+        auth.on_refresh(lambda token: save_token(token, args.token_file))
+        # 没有 token 时用缓存的凭据登录一次
+        token = args.token or load_token(args.token_file) or auth.relogin()
+        if not token:
+            raise SystemExit("缺少 Token，请使用 --token、--token-file 或 --login 指定")
+        client = AutoDLClient(token, rate_limit=args.rate_limit)
+        client.auth = auth
+        runner = build_watcher(args, client, notifier)
+
+    recorder = client.recorder = Recorder(args.record) if args.record else None
+    history = HistoryStore(args.history) if args.history else None
+    if history:
+        runner.subscribe("status", history.record_result)
+    metrics_server = metrics_log = None
+    if args.metrics_port is not None:
+        metrics_server = MetricsServer(port=args.metrics_port).start()
+        print(f"指标: http://127.0.0.1:{metrics_server.port}/metrics")
+    if args.metrics_log:
+        metrics_log = MetricsLog(args.metrics_log, interval=args.metrics_log_interval)
+        metrics_log.start()
+    runner.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        runner.stop()
+        await notifier.close()
+        client.close()
+        if recorder:
+            recorder.close()
+        if history:
+            history.close()
+        if metrics_server:
+            metrics_server.close()
+        if metrics_log:
+            metrics_log.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
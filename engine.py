@@ -0,0 +1,819 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from alerts import AvailabilityTracker, PowerOnGuard
+import metrics
+from auth import is_auth_failure
+from changes import ChangeDetector, combine
+from confirm import PowerOnTracker
+from page_index import PageIndex
+from records import decode_machine_list, fingerprint
+from request_manager import RequestManager
+from rules import ACTION_COMMAND, ACTION_POWER_ON, RuleSet, run_command
+from scheduler import PollScheduler, RateLimiter
+from snipe import Sniper, card_taken
+
+API_BASE = "https://private.autodl.com"
+MACHINE_LIST_PATH = "/api/v2/machine/list"
+INSTANCE_LIST_PATH = "/api/v2/instance/list"
+POWER_ON_PATH = "/api/v2/instance/power_on"
+
+# 检查范围：当前页 / 全部页 / 仅被监控机器所在的页
+SCOPE_PAGE = "page"
+SCOPE_ALL = "all"
+SCOPE_MONITORED = "monitored"
+
+
+def load_token(path="token.txt"):
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except Exception:
+        return ""
+
+
+def save_token(token, path="token.txt"):
+    try:
+        with open(path, "w") as f:
+            f.write(token)
+    except Exception:
+        pass
+
+
+class AutoDLClient:
+    """AutoDL API 客户端，所有请求共享同一个 keep-alive 连接池"""
+
+    def __init__(
+        self, token="", base_url=API_BASE, pool_size=8, timeout=10, rate_limit=10.0
+    ):
+        self.token = token
+        self.base_url = base_url
+        self.timeout = timeout
+        self.limiter = RateLimiter(rate_limit, burst=max(1, int(rate_limit)))
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # requests 是阻塞的，放到固定大小的线程池里执行，再交给 asyncio 等待
+        self.executor = ThreadPoolExecutor(
+            max_workers=pool_size, thread_name_prefix="autodl-http"
+        )
+        # 开机请求使用单独的连接和线程，不会排在列表请求后面
+        self.fast_session = requests.Session()
+        self.fast_executor = ThreadPoolExecutor(
+            max_workers=2, thread_name_prefix="autodl-fast"
+        )
+        self.fast_used_at = 0.0
+        # 可选的 auth.AuthSession，token 失效时自动重新登录并重发请求
+        self.auth = None
+        self._refresh_lock = None
+        # 相同的列表请求在途时合并为一次
+        self.requests = RequestManager()
+        # (路径, 请求体, token) -> (响应体摘要, 解码结果)，响应没变时不再解码
+        self.decoded = {}
+        # 可选的 replay.Recorder，记录每个请求和响应
+        self.recorder = None
+
+    def post(self, path, payload, session=None, token=None, decode=None):
+        """同步发送 POST 请求，失败时返回 {"error": ...}
+
+        decode 用于在请求线程中把解析出的 JSON 转换为记录，不占用事件循环
+        """
+        headers = {
+            "Authorization": token or self.token,
+            "Content-Type": "application/json",
+        }
+        pool = "fast" if session is self.fast_session else "normal"
+        session = session or self.session
+        metrics.IN_FLIGHT.inc(pool=pool)
+        started = time.perf_counter()
+        try:
+            result = self._post(session, path, payload, headers, decode)
+        finally:
+            metrics.IN_FLIGHT.dec(pool=pool)
+            metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, path=path)
+        if "error" not in result and result.get("code") != "Success":
+            metrics.API_ERRORS.inc(path=path, code=result.get("code"))
+        return result
+
+    def _post(self, session, path, payload, headers, decode):
+        body = json.dumps(payload)
+        try:
+            resp = session.post(
+                self.base_url + path,
+                data=body,
+                headers=headers,
+                timeout=self.timeout,
+            )
+        except requests.RequestException as e:
+            metrics.REQUESTS.inc(path=path, status="network")
+            if self.recorder is not None:
+                self.recorder.record(path, payload, error=str(e))
+            return {"error": str(e)}
+        metrics.REQUESTS.inc(path=path, status=resp.status_code)
+        if self.recorder is not None:
+            self.recorder.record(
+                path,
+                payload,
+                resp.status_code,
+                resp.content.decode("utf-8", "replace"),
+                elapsed=resp.elapsed.total_seconds(),
+            )
+        if resp.status_code >= 400:
+            result = {"error": f"HTTP {resp.status_code}", "status": resp.status_code}
+            try:
+                result["retry_after"] = float(resp.headers["Retry-After"])
+            except (KeyError, ValueError):
+                pass
+            return result
+        if decode is not None:
+            # 大多数检查得到的响应与上次完全相同，直接复用上次的解码结果
+            key = (path, body, headers["Authorization"])
+            digest = hashlib.blake2b(resp.content, digest_size=16).digest()
+            cached = self.decoded.get(key)
+            if cached is not None and cached[0] == digest:
+                metrics.UNCHANGED.inc(stage="decode")
+                return cached[1]
+        started = time.perf_counter()
+        try:
+            result = resp.json()
+            if not isinstance(result, dict):
+                # 所有接口都返回 JSON 对象，其它类型按错误处理，调用方可以放心 .get
+                error = f"响应不是 JSON 对象: {type(result).__name__}"
+                return {"error": error, "status": resp.status_code}
+            if decode is None:
+                return result
+            result = decode(result)
+            if result.get("code") == "Success":
+                self.decoded[key] = (digest, result)
+            return result
+        except ValueError as e:
+            return {"error": str(e), "status": resp.status_code}
+        except (AttributeError, KeyError, TypeError) as e:
+            # 响应结构与预期不符（缺少字段、类型不对），按错误返回，不让检查任务退出
+            return {"error": f"响应格式错误: {e!r}", "status": resp.status_code}
+        finally:
+            metrics.DECODE_SECONDS.observe(time.perf_counter() - started, path=path)
+
+    async def request(
+        self, path, payload, limited=True, fast=False, token=None, decode=None
+    ):
+        """token 为空时使用客户端自己的 token，多账号共用连接池时按请求指定
+
+        除开机外，路径、参数和 token 都相同的请求在途时直接等待其结果
+        """
+        if fast:
+            return await self._request(path, payload, limited, fast, token, decode)
+        key = (path, json.dumps(payload, sort_keys=True), token or self.token)
+        return await self.requests.coalesce(
+            key, lambda: self._request(path, payload, limited, fast, token, decode)
+        )
+
+    async def _request(self, path, payload, limited, fast, token, decode):
+        if limited:
+            await self.limiter.acquire()
+        used_token = self.token
+        result = await self._send(path, payload, fast, token, decode)
+        if token is None and self.auth is not None and is_auth_failure(result):
+            if await self.refresh_token(used_token):
+                if payload.get("tenant_uuid") == used_token:
+                    payload = {**payload, "tenant_uuid": self.token}
+                result = await self._send(path, payload, fast, token, decode)
+        return result
+
+    async def _send(self, path, payload, fast, token, decode=None):
+        loop = asyncio.get_running_loop()
+        if fast:
+            self.fast_used_at = time.monotonic()
+            return await loop.run_in_executor(
+                self.fast_executor,
+                self.post,
+                path,
+                payload,
+                self.fast_session,
+                token,
+                decode,
+            )
+        return await loop.run_in_executor(
+            self.executor, self.post, path, payload, None, token, decode
+        )
+
+    async def refresh_token(self, failed_token):
+        """重新登录，多个请求同时失败时只登录一次；返回是否拿到了新 token"""
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        async with self._refresh_lock:
+            if self.token != failed_token:
+                # 其它请求已经刷新过
+                return True
+            loop = asyncio.get_running_loop()
+            token = await loop.run_in_executor(self.executor, self.auth.relogin)
+            if not token:
+                return False
+            self.token = token
+            return True
+
+    def _warm(self):
+        try:
+            self.fast_session.head(self.base_url, timeout=self.timeout)
+        except requests.RequestException:
+            pass
+
+    async def warm(self):
+        """在快速通道上发一个轻量请求，保持 TLS 连接不被服务端关闭"""
+        self.fast_used_at = time.monotonic()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.fast_executor, self._warm)
+
+    async def machine_list(self, page_index=1, page_size=4, token=None):
+        """机器列表中的每台机器解码为 records.Machine"""
+        payload = {"page_index": page_index, "page_size": page_size}
+        return await self.request(
+            MACHINE_LIST_PATH, payload, token=token, decode=decode_machine_list
+        )
+
+    async def instance_list(self, page_index=1, page_size=10, token=None):
+        payload = {
+            "page_index": page_index,
+            "page_size": page_size,
+            "tenant_uuid": token or self.token,
+        }
+        return await self.request(INSTANCE_LIST_PATH, payload, token=token)
+
+    async def power_on(self, instance_uuid, token=None):
+        payload = {"instance_uuid": instance_uuid, "start_mode": "gpu"}
+        # 开机请求分秒必争，不受限速约束
+        return await self.request(
+            POWER_ON_PATH, payload, limited=False, fast=True, token=token
+        )
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.fast_executor.shutdown(wait=False)
+        self.session.close()
+        self.fast_session.close()
+
+
+def page_count(result, page_size):
+    """从机器列表响应中获取总页数，缺少 max_page 时按 result_total 推算"""
+    data = result["data"]
+    if data.get("max_page"):
+        return data["max_page"]
+    total = data.get("result_total")
+    if total is not None:
+        return max(1, -(-total // page_size))
+    return 1
+
+
+def merge_pages(first, machines, pages=()):
+    """把多页机器合并成一个与单页响应格式相同的快照，指纹由 pages 的指纹合成"""
+    data = dict(first["data"])
+    data["list"] = machines
+    data["page_index"] = 1
+    data["page_size"] = len(machines)
+    data["max_page"] = 1
+    fingerprint = combine(page.get("fingerprint") for page in pages or [first])
+    return {**first, "data": data, "fingerprint": fingerprint}
+
+
+def is_success(result):
+    return "error" not in result and result.get("code") == "Success"
+
+
+def record_power_on(source, result):
+    metrics.POWER_ON.inc(
+        source=source, result="success" if is_success(result) else "failure"
+    )
+
+
+async def run_polls(check, scheduler):
+    """按调度器给出的间隔反复执行 check，并记录每次检查的耗时和延后"""
+    loop = asyncio.get_running_loop()
+    scheduled = None
+    while True:
+        started = loop.time()
+        if scheduled is not None:
+            # 事件循环繁忙时，检查会比计划的时间晚开始
+            metrics.POLL_LAG_SECONDS.observe(max(0.0, started - scheduled))
+        result = await check()
+        elapsed = loop.time() - started
+        success = is_success(result)
+        metrics.POLL_SECONDS.observe(elapsed)
+        metrics.POLLS.inc(result="success" if success else "error")
+        delay = scheduler.next_delay(
+            success, elapsed=elapsed, retry_after=result.get("retry_after")
+        )
+        scheduled = loop.time() + delay
+        await asyncio.sleep(delay)
+
+
+class Watcher:
+    """与界面无关的监控引擎，结果通过 subscribe 注册的回调分发
+
+    事件:
+        catalog(result)            后台拉取的全部机器，用于维护本地机器目录
+        status(result)             定时检查得到的机器列表
+        instances(result)          实例列表
+        available(machine)         被监控的机器空闲GPU变为达到阈值（每次变化只触发一次）
+        power_on(uuid, result)     自动开机请求完成
+        error(result)              定时检查失败（网络错误或 API 返回错误）
+        snipe(record)              自动开机的延迟记录
+        instance(instance)         跟踪开机时查询到的单个实例的最新状态
+        startup(record)            开机请求成功后实例运行或失败，含耗时和自动开机的变化
+        rule(rule, machines)       监控规则触发，动作已在引擎中执行
+    """
+
+    def __init__(
+        self,
+        client,
+        interval=5.0,
+        threshold=1,
+        page_size=4,
+        scope=SCOPE_PAGE,
+        catalog_page_size=20,
+        max_concurrency=4,
+    ):
+        self.client = client
+        self.scheduler = PollScheduler(interval)
+        self.threshold = threshold
+        self.page_index = 1
+        self.page_size = page_size
+        self.scope = scope
+        self.catalog_page_size = catalog_page_size
+        self.max_concurrency = max_concurrency
+        # 机器ID -> 页码，SCOPE_MONITORED 模式下在后台按需重建
+        self.page_index_map = PageIndex(catalog_page_size)
+        self._rebuild_task = None
+        # 最近一次重建后确认不在目录中的被监控机器，避免每次检查都重建
+        self._known_absent = set()
+        # 只在机器变为可用时通知/开机，开机请求按实例去重
+        self.tracker = AvailabilityTracker()
+        self.power_on_guard = PowerOnGuard()
+        self.sniper = Sniper(client)
+        # 开机请求成功后确认实例是否真正运行
+        self.confirm = PowerOnTracker(self)
+        # 手动刷新和翻页：新请求取代旧请求，过期的结果不再分发
+        self.requests = RequestManager()
+        self._tasks = set()
+        self._warm_task = None
+        self.monitored_machines = set()
+        # 自动开机：实例只能在所在机器上开机，按机器ID索引已选择的实例
+        self.armed_instances = set()
+        self.instances = {}
+        # 实例ID -> (页码, 每页数量)，跟踪开机时只查询实例所在的页
+        self.instance_pages = {}
+        self.machine_instances = {}
+        self.instances_refreshed_at = 0.0
+        self.instance_refresh_interval = 60.0
+        # 后台定期拉取全部机器，界面据此筛选和搜索
+        self.catalog_interval = 300.0
+        self._catalog_task = None
+        # 声明式监控规则，见 rules.py
+        self.rules = RuleSet()
+        # 快照和设置都没有变化时跳过规则评估、历史写入和界面刷新
+        self.changes = ChangeDetector()
+        # 被监控机器距离阈值最少还差几张卡，调度器据此决定检查间隔
+        self.gap = None
+        # 冷却、连续次数等判断使用的时钟，回放时换成记录中的时间
+        self.clock = time.monotonic
+        # 后台任务（开机确认）的等待，回放时按倍速缩短
+        self.sleep = asyncio.sleep
+        self._listeners = {}
+        self._task = None
+
+    def subscribe(self, event, callback):
+        self._listeners.setdefault(event, []).append(callback)
+
+    def emit(self, event, *args):
+        for callback in self._listeners.get(event, []):
+            callback(*args)
+
+    @property
+    def interval(self):
+        return self.scheduler.interval
+
+    @interval.setter
+    def interval(self, value):
+        self.scheduler.interval = value
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    async def fetch_instances(self, page_index=1, page_size=10):
+        result = await self.requests.latest(
+            "instances", self.client.instance_list(page_index, page_size)
+        )
+        if result is None:
+            return None
+        if is_success(result):
+            self.update_instances(result["data"]["list"], (page_index, page_size))
+        self.emit("instances", result)
+        return result
+
+    def update_instances(self, instances, page=None):
+        for instance in instances:
+            self.instances[instance["instance_uuid"]] = instance
+            if page is not None:
+                self.instance_pages[instance["instance_uuid"]] = page
+        self.rebuild_affinity()
+
+    def apply_settings(self, monitored, armed, scope, threshold):
+        """一次替换监控设置；monitored 和 armed 由调用方复制，之后不再修改"""
+        self.monitored_machines = monitored
+        self.arm(armed)
+        self.scope = scope
+        self.threshold = threshold
+
+    def arm(self, instance_uuids):
+        """设置自动开机的实例集合"""
+        self.armed_instances = set(instance_uuids)
+        self.rebuild_affinity()
+
+    def rebuild_affinity(self):
+        machine_instances = {}
+        for instance_uuid in sorted(self.armed_instances):
+            instance = self.instances.get(instance_uuid)
+            if instance is not None and instance.get("machine_id"):
+                machine_instances.setdefault(instance["machine_id"], []).append(
+                    instance
+                )
+        self.machine_instances = machine_instances
+
+    async def refresh_instances(self, page_size=50):
+        """拉取全部实例，更新自动开机实例的状态和所在机器"""
+        self.instances_refreshed_at = self.clock()
+        page_index = 1
+        while True:
+            result = await self.client.instance_list(page_index, page_size)
+            if not is_success(result):
+                return
+            self.update_instances(result["data"]["list"], (page_index, page_size))
+            if page_index >= result["data"].get("max_page", 1):
+                return
+            page_index += 1
+
+    async def lookup_instance(self, instance_uuid):
+        """查询单个实例的最新状态并分发 instance 事件，找不到时返回 None
+
+        接口不支持按实例ID查询，只拉取上次见到该实例的页；实例不在该页时
+        重新拉取全部实例。
+        """
+        page = self.instance_pages.get(instance_uuid)
+        instance = None
+        if page is not None:
+            result = await self.client.instance_list(*page)
+            if is_success(result):
+                self.update_instances(result["data"]["list"], page)
+                for item in result["data"]["list"]:
+                    if item["instance_uuid"] == instance_uuid:
+                        instance = item
+        if instance is None:
+            self.instance_pages.pop(instance_uuid, None)
+            await self.refresh_instances()
+            if instance_uuid in self.instance_pages:
+                instance = self.instances[instance_uuid]
+        if instance is not None:
+            self.emit("instance", instance)
+        return instance
+
+    def finish_startup(self, record):
+        """实例运行后取消自动开机；失败时保持选择并允许立即重新开机"""
+        instance_uuid = record["instance_uuid"]
+        if record["success"]:
+            record["disarmed"] = instance_uuid in self.armed_instances
+            if record["disarmed"]:
+                self.armed_instances.discard(instance_uuid)
+                self.rebuild_affinity()
+        else:
+            self.power_on_guard.last_success.pop(instance_uuid, None)
+            record["disarmed"] = False
+        self.emit("startup", record)
+
+    def watched_machines(self):
+        """需要检查的机器：被监控的机器、自动开机实例所在的机器和规则指定的机器"""
+        return (
+            self.monitored_machines
+            | set(self.machine_instances)
+            | set(self.rules.machine_ids)
+        )
+
+    async def fetch_pages(self, page_indexes):
+        """以有限的并发数拉取若干页，返回与 page_indexes 顺序一致的响应列表"""
+        page_size = self.catalog_page_size
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def fetch_page(page_index):
+            async with semaphore:
+                return await self.client.machine_list(page_index, page_size)
+
+        return await asyncio.gather(*(fetch_page(i) for i in page_indexes))
+
+    async def fetch_all_machines(self):
+        """并发拉取机器列表的所有页并合并为一个快照，失败时返回 {"error": ...}"""
+        first = await self.client.machine_list(1, self.catalog_page_size)
+        if not is_success(first):
+            return first
+
+        total_pages = page_count(first, self.catalog_page_size)
+        pages = await self.fetch_pages(range(2, total_pages + 1))
+        machines = list(first["data"]["list"])
+        for page in pages:
+            if not is_success(page):
+                return page
+            machines.extend(page["data"]["list"])
+        self.page_index_map.rebuild(machines)
+        self._known_absent = self.watched_machines() - set(self.page_index_map.pages)
+        return merge_pages(first, machines, [first, *pages])
+
+    async def refresh_catalog(self):
+        """拉取全部机器并分发 catalog 事件，同时重建页码索引"""
+        result = await self.requests.latest("catalog", self.fetch_all_machines())
+        if result is None:
+            return None
+        self.emit("catalog", result)
+        return result
+
+    async def run_catalog(self):
+        while True:
+            await self.refresh_catalog()
+            await asyncio.sleep(self.catalog_interval)
+
+    def start_catalog(self):
+        """开始后台维护机器目录，与定时检查相互独立，需在事件循环线程中调用"""
+        if self._catalog_task is None or self._catalog_task.done():
+            self._catalog_task = asyncio.ensure_future(self.run_catalog())
+
+    def stop_catalog(self):
+        if self._catalog_task is not None:
+            self._catalog_task.cancel()
+            self._catalog_task = None
+
+    async def rebuild_page_index(self):
+        result = await self.fetch_all_machines()
+        if not is_success(result):
+            self.page_index_map.built_at = 0.0
+
+    def schedule_rebuild(self):
+        """在后台重建机器页码索引，同一时间只运行一个重建任务"""
+        if self._rebuild_task is None or self._rebuild_task.done():
+            self._rebuild_task = asyncio.ensure_future(self.rebuild_page_index())
+
+    async def fetch_monitored_pages(self, watched=None):
+        """只拉取包含被监控机器的页，watched 默认为 watched_machines()"""
+        index = self.page_index_map
+        if not index:
+            # 尚无索引时全量拉取一次，顺带建立索引
+            return await self.fetch_all_machines()
+
+        if watched is None:
+            watched = self.watched_machines()
+        pages, missing = index.lookup(watched)
+        missing -= self._known_absent
+        page_indexes = sorted(pages)
+        results = await self.fetch_pages(page_indexes)
+        machines = []
+        first = None
+        for page_index, page in zip(page_indexes, results):
+            if not is_success(page):
+                return page
+            first = first or page
+            machines.extend(page["data"]["list"])
+            missing |= index.update_page(page_index, page["data"]["list"])
+
+        # 被监控的机器不在预期的页上，或索引过期，说明目录发生了变动
+        if (missing & watched) or index.expired:
+            self.schedule_rebuild()
+        if first is None:
+            # 没有需要拉取的页：固定的空指纹，避免每次检查都视为有变化
+            return {
+                "code": "Success",
+                "data": {"list": []},
+                "fingerprint": fingerprint(()),
+            }
+        return merge_pages(first, machines, results)
+
+    async def fetch_snapshot(self):
+        if self.scope == SCOPE_ALL:
+            return await self.fetch_all_machines()
+        if self.scope == SCOPE_MONITORED:
+            return await self.fetch_monitored_pages()
+        return await self.client.machine_list(self.page_index, self.page_size)
+
+    async def check_status(self):
+        if not self.client.token:
+            result = {"error": "缺少 Token"}
+            self.emit("error", result)
+            return result
+        result = await self.fetch_snapshot()
+        return self.process_snapshot(result, time.perf_counter())
+
+    def snapshot_changed(self, result):
+        """快照指纹或影响处理结果的设置与上次不同时返回 True"""
+        fingerprint = result.get("fingerprint")
+        if fingerprint is None:
+            self.changes.reset()
+            return True
+        key = (
+            fingerprint,
+            frozenset(self.monitored_machines),
+            self.threshold,
+            self.rules,
+        )
+        return self.changes.changed(key, self.clock())
+
+    def process_snapshot(self, result, detected_at):
+        """对一次检查的结果触发通知、自动开机并分发 status 事件
+
+        快照没有变化时只处理自动开机（上次开机失败后需要重试）、冷却中等待
+        触发的机器和规则，以及按检查次数计数的规则，不再分发 status 事件。
+        """
+        if not is_success(result):
+            self.changes.reset()
+            self.emit("error", result)
+            return result
+
+        changed = self.snapshot_changed(result)
+        now = self.clock()
+        triggered = []
+        if changed:
+            self.gap = self.threshold_gap(result["data"]["list"])
+        # 冷却期内变为可用的机器即使快照没有变化也要再判断，冷却结束后才通知
+        if changed or self.tracker.waiting:
+            self.tracker.forget(self.monitored_machines)
+            triggered = [
+                machine
+                for machine in result["data"]["list"]
+                if machine.machine_id in self.monitored_machines
+                and self.tracker.update(
+                    machine.machine_id, machine.gpu_idle >= self.threshold, now
+                )
+            ]
+
+        # 先发出开机请求，再做通知和界面更新
+        if self.machine_instances:
+            for machine in result["data"]["list"]:
+                self.start_armed(machine, detected_at)
+        fired = []
+        if changed or self.rules.counts_polls or self.rules.pending:
+            fired = self.rules.evaluate(result["data"]["list"], now)
+        for rule, machines in fired:
+            self.run_rule(rule, machines, detected_at)
+        if (
+            self.armed_instances
+            and self.clock() - self.instances_refreshed_at
+            > self.instance_refresh_interval
+        ):
+            self.spawn(self.refresh_instances())
+        for machine in triggered:
+            self.emit("available", machine)
+        for rule, machines in fired:
+            self.emit("rule", rule, machines)
+
+        self.scheduler.observe(changed, self.gap)
+        if changed:
+            self.emit("status", result)
+        else:
+            metrics.UNCHANGED.inc(stage="poll")
+        return result
+
+    def threshold_gap(self, machines):
+        """被监控的机器和自动开机实例所在的机器中，距离可用最少还差几张空闲卡
+
+        已经达到阈值的机器不计入，都达到或没有这些机器时返回 None。
+        """
+        gaps = []
+        for machine in machines:
+            if machine.machine_id in self.monitored_machines:
+                need = self.threshold
+            elif machine.machine_id in self.machine_instances:
+                need = min(
+                    instance.get("req_gpu_amount") or 1
+                    for instance in self.machine_instances[machine.machine_id]
+                )
+            else:
+                continue
+            if machine.gpu_idle < need:
+                gaps.append(need - machine.gpu_idle)
+        return min(gaps, default=None)
+
+    def start_armed(self, machine, detected_at):
+        """在空闲GPU数量以内，并行开机该机器上已选择自动开机的实例"""
+        armed = self.machine_instances.get(machine.machine_id)
+        if not armed:
+            return
+        capacity = machine.gpu_idle
+        for instance in armed:
+            need = instance.get("req_gpu_amount") or 1
+            if instance.get("status") == "running" or need > capacity:
+                continue
+            capacity -= need
+            # 正在开机或等待确认的实例同样占用空闲卡，但不重复发送请求
+            if (
+                instance["instance_uuid"] not in self.power_on_guard.in_flight
+                and instance["instance_uuid"] not in self.confirm
+            ):
+                self.spawn(self.auto_power_on(instance["instance_uuid"], detected_at))
+
+    def run_rule(self, rule, machines, detected_at):
+        kind, arg = rule.action
+        if kind == ACTION_POWER_ON:
+            self.spawn(self.auto_power_on(arg, detected_at))
+        elif kind == ACTION_COMMAND:
+            self.spawn(run_command(arg, rule, machines))
+
+    def spawn(self, coro):
+        # 保留任务引用，避免后台任务在完成前被回收
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def auto_power_on(self, instance_uuid, detected_at=None):
+        """自动开机：同一实例已有请求在途或刚开机成功时直接跳过"""
+        if not self.power_on_guard.acquire(instance_uuid, self.clock()):
+            return None
+        if detected_at is None:
+            detected_at = time.perf_counter()
+        result = {"error": "已取消"}
+        try:
+            result, record = await self.sniper.fire(instance_uuid, detected_at)
+        finally:
+            # 空闲卡被抢走不是请求本身的问题，下次出现空闲卡时立即再试
+            self.power_on_guard.release(
+                instance_uuid,
+                is_success(result),
+                self.clock(),
+                penalize=not card_taken(result),
+            )
+        record_power_on("auto", result)
+        if is_success(result):
+            self.confirm.track(instance_uuid, "auto")
+        metrics.DETECT_TO_REQUEST_SECONDS.observe(record["detect_to_request"])
+        metrics.DETECT_TO_ACK_SECONDS.observe(record["detect_to_ack"])
+        self.emit("power_on", instance_uuid, result)
+        self.emit("snipe", record)
+        return result
+
+    async def power_on(self, instance_uuid):
+        result = await self.client.power_on(instance_uuid)
+        record_power_on("manual", result)
+        if is_success(result):
+            self.confirm.track(instance_uuid, "manual")
+        self.emit("power_on", instance_uuid, result)
+        return result
+
+    async def run(self):
+        await run_polls(self.check_status, self.scheduler)
+
+    def start(self):
+        """开始定时检查，需在事件循环线程中调用"""
+        if not self.running:
+            self._task = asyncio.ensure_future(self.run())
+            self._warm_task = asyncio.ensure_future(self.sniper.keep_warm())
+            if self.armed_instances:
+                self.spawn(self.refresh_instances())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._warm_task is not None:
+            self._warm_task.cancel()
+            self._warm_task = None
+        if self._rebuild_task is not None:
+            self._rebuild_task.cancel()
+            self._rebuild_task = None
+
+
+class EngineThread:
+    """在后台线程中运行 asyncio 事件循环，供 Qt 界面提交协程"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(
+            target=self._run, name="autodl-engine", daemon=True
+        )
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def start(self):
+        self.thread.start()
+
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call(self, callback, *args):
+        self.loop.call_soon_threadsafe(callback, *args)
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
@@ -0,0 +1,135 @@
+import queue
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS machines (
+    id INTEGER PRIMARY KEY,
+    machine_id TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS samples (
+    machine INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    idle INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    online_status INTEGER NOT NULL,
+    health_status INTEGER NOT NULL,
+    PRIMARY KEY (machine, ts)
+) WITHOUT ROWID;
+"""
+
+
+class HistoryStore:
+    """GPU 空闲历史，SQLite WAL 模式存储
+
+    record() 只把快照放进队列，由后台写线程批量插入，不阻塞调用方。
+    样本按 (机器, 时间) 聚簇存储，查询单台机器一段时间的历史只需一次范围扫描。
+    """
+
+    def __init__(self, path="history.db", batch_interval=1.0):
+        self.path = path
+        self.batch_interval = batch_interval
+        self.queue = queue.Queue()
+        self.local = threading.local()
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.commit()
+        self.writer = threading.Thread(
+            target=self._write_loop, name="history-writer", daemon=True
+        )
+        self.writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self):
+        # sqlite 连接不能跨线程使用，每个查询线程各自持有一个
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = self._connect()
+        return conn
+
+    def record(self, machines, ts=None):
+        """追加一次检查得到的机器列表"""
+        ts = int(ts if ts is not None else time.time())
+        rows = [
+            (
+                machine.machine_id,
+                ts,
+                machine.gpu_idle,
+                machine.gpu_total,
+                machine.online_status,
+                machine.health_status,
+            )
+            for machine in machines
+        ]
+        if rows:
+            self.queue.put(rows)
+
+    def record_result(self, result):
+        """作为 Watcher 的 status 事件回调使用"""
+        self.record(result["data"]["list"])
+
+    def _write_loop(self):
+        conn = self._connect()
+        ids = dict(conn.execute("SELECT machine_id, id FROM machines"))
+        while True:
+            batch = self.queue.get()
+            if batch is None:
+                break
+            rows = list(batch)
+            stop = False
+            # 攒一小段时间内的所有快照，一个事务写入
+            deadline = time.monotonic() + self.batch_interval
+            while True:
+                try:
+                    more = self.queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if more is None:
+                    stop = True
+                    break
+                rows.extend(more)
+            with conn:
+                for row in rows:
+                    if row[0] not in ids:
+                        cursor = conn.execute(
+                            "INSERT INTO machines (machine_id) VALUES (?)", (row[0],)
+                        )
+                        ids[row[0]] = cursor.lastrowid
+                conn.executemany(
+                    "INSERT OR REPLACE INTO samples VALUES (?, ?, ?, ?, ?, ?)",
+                    [(ids[row[0]],) + row[1:] for row in rows],
+                )
+            if stop:
+                break
+        conn.close()
+
+    def idle_history(self, machine_id, days=7, until=None):
+        """返回某台机器最近 days 天的 [(ts, idle, total, online_status, health_status)]"""
+        until = until if until is not None else time.time()
+        since = int(until - days * 86400)
+        return self._reader().execute(
+            "SELECT ts, idle, total, online_status, health_status FROM samples "
+            "WHERE machine = (SELECT id FROM machines WHERE machine_id = ?) "
+            "AND ts >= ? AND ts <= ? ORDER BY ts",
+            (machine_id, since, int(until)),
+        ).fetchall()
+
+    def idle_samples(self, machine_id, since):
+        """返回某台机器 since 之后的 [(ts, idle)]，供统计分析增量加载"""
+        return self._reader().execute(
+            "SELECT ts, idle FROM samples "
+            "WHERE machine = (SELECT id FROM machines WHERE machine_id = ?) "
+            "AND ts >= ? ORDER BY ts",
+            (machine_id, int(since)),
+        ).fetchall()
+
+    def close(self):
+        """写入队列中剩余的样本后关闭"""
+        self.queue.put(None)
+        self.writer.join()
@@ -1,5 +1,3 @@
-import hashlib
-import requests
 from PySide6.QtWidgets import (
     QDialog,
     QVBoxLayout,
@@ -8,13 +6,18 @@ from PySide6.QtWidgets import (
     QLineEdit,
     QPushButton,
     QMessageBox,
+    QCheckBox,
 )
 
+from auth import AuthSession, LoginError
+
 
 class LoginDialog(QDialog):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, auth=None):
         super().__init__(parent)
         self.token = None
+        # 登录请求复用同一个 Session，凭据也由它缓存，供 token 过期后自动重新登录
+        self.auth = auth or AuthSession()
         self.setWindowTitle("用户登录")
         self.init_ui()
 
@@ -35,6 +38,13 @@ class LoginDialog(QDialog):
         self.pwd_input.setEchoMode(QLineEdit.EchoMode.Password)
         pwd_layout.addWidget(self.pwd_input)
         layout.addLayout(pwd_layout)
+        # token 过期后自动重新登录：需要在本地保存可直接登录的密码摘要，默认不勾选
+        self.remember_cb = QCheckBox("token 过期时自动重新登录")
+        self.remember_cb.setToolTip(
+            "保存的密码摘要可直接用于登录，与密码同样敏感。安装了 keyring 时保存在"
+            "系统凭据管理器中，否则以明文保存在 credentials.json。"
+        )
+        layout.addWidget(self.remember_cb)
         # 按钮区域
         btn_layout = QHBoxLayout()
         self.login_btn = QPushButton("登录")
@@ -52,49 +62,20 @@ class LoginDialog(QDialog):
             QMessageBox.warning(self, "输入错误", "请输入账号和密码")
             return
 
-        # 使用 SHA1 对密码进行散列
-        hashed_pwd = hashlib.sha1(pwd.encode()).hexdigest()
-
-        # 第一个请求: 获取 ticket
-        login_payload = {
-            "phone": phone,
-            "password": hashed_pwd,
-            "v_code": "",
-            "phone_area": "+86",
-            "picture_id": None,
-        }
         try:
-            resp = requests.post(
-                "https://www.autodl.com/api/v1/new_login", json=login_payload
+            self.token = self.auth.login(
+                phone, pwd, remember=self.remember_cb.isChecked()
             )
-            resp_data = resp.json()
-            if resp_data.get("code") != "Success":
-                QMessageBox.critical(self, "登录失败", resp_data.get("msg", "未知错误"))
-                return
-            ticket = resp_data["data"]["ticket"]
-        except Exception as e:
-            QMessageBox.critical(self, "请求错误", str(e))
+        except LoginError as e:
+            QMessageBox.critical(self, "登录失败", str(e))
             return
-
-        # 第二个请求: 使用 ticket 获取 token
-        # 注意此处私有云和公有云使用不同的接口
-        passport_payload = {"ticket": ticket, "third_party_login": False}
-        try:
-            resp2 = requests.post(
-                "https://private.autodl.com/api/v2/login", json=passport_payload
-            )
-            resp2_data = resp2.json()
-            if resp2_data.get("code") != "Success":
-                QMessageBox.critical(
-                    self, "登录失败", resp2_data.get("msg", "未知错误")
-                )
-                return
-            self.token = resp2_data["data"]["token"]
-            QMessageBox.information(self, "登录成功", "账号登录成功")
-            self.accept()
         except Exception as e:
             QMessageBox.critical(self, "请求错误", str(e))
             return
+        if not self.remember_cb.isChecked():
+            self.auth.forget_credentials()
+        QMessageBox.information(self, "登录成功", "账号登录成功")
+        self.accept()
 
     def get_token(self) -> str:
         return self.token
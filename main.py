@@ -1,5 +1,8 @@
-import sys
+import asyncio
 import json
+import os
+import sys
+import time
 from PySide6.QtWidgets import (
     QApplication,
     QMainWindow,
@@ -8,54 +11,78 @@ from PySide6.QtWidgets import (
     QHBoxLayout,
     QLabel,
     QPushButton,
-    QTableWidget,
-    QTableWidgetItem,
+    QTableView,
     QHeaderView,
     QSpinBox,
-    QCheckBox,
     QMessageBox,
     QPlainTextEdit,
     QComboBox,
     QAbstractItemView,
     QDialog,
-    QButtonGroup
+    QLineEdit,
+    QCheckBox,
 )
-from PySide6.QtCore import QTimer, QThread, Signal, QUrl, QEventLoop, Qt
-from PySide6.QtGui import QColor
-from PySide6.QtNetwork import QNetworkAccessManager, QNetworkRequest, QNetworkReply
-from win11toast import toast
-import threading
+from PySide6.QtCore import QObject, Qt, QTimer, Signal
+import metrics
+from auth import AuthSession
+from cache import SnapshotCache
+from catalog import Catalog
+from history import HistoryStore
 from login import LoginDialog
+from models import InstanceTableModel, MachineTableModel
+from notify import DesktopSink, Notifier, NotifyError, StdoutSink, parse_sink
+from records import STATUS_FAULT, STATUS_FREE, STATUS_FULL, STATUS_OFFLINE
+from rules import load_rules
+from engine import (
+    SCOPE_ALL,
+    SCOPE_MONITORED,
+    AutoDLClient,
+    EngineThread,
+    Watcher,
+    load_token,
+    save_token,
+)
 
-
-class RequestThread(QThread):
-    finished = Signal(dict)
-
-    def __init__(self, url, token, payload=None):
-        super().__init__()
-        self.url = url
-        self.token = token
-        self.payload = payload or {"page_index": 1, "page_size": 4}
-
-    def run(self):
-        manager = QNetworkAccessManager()
-        request = QNetworkRequest(QUrl(self.url))
-        request.setRawHeader(b"Authorization", self.token.encode())
-        request.setHeader(
-            QNetworkRequest.KnownHeaders.ContentTypeHeader, "application/json"
-        )
-        data_bytes = json.dumps(self.payload).encode()
-        reply = manager.post(request, data_bytes)
-
-        loop = QEventLoop()
-        reply.finished.connect(loop.quit)
-        loop.exec()
-
-        if reply.error() == QNetworkReply.NetworkError.NoError:
-            data = json.loads(reply.readAll().data().decode("utf-8"))
-            self.finished.emit(data)
-        else:
-            self.finished.emit({"error": reply.errorString()})
+# 表格列 -> 目录排序字段，其它列按目录顺序显示
+SORT_COLUMNS = {
+    1: "machine_id",
+    2: "machine_name",
+    3: "gpu_name",
+    4: "gpu_total",
+    5: "gpu_idle",
+    10: "status",
+}
+
+
+class EngineBridge(QObject):
+    """把引擎线程中的回调转成 Qt 信号，保证在界面线程中处理"""
+
+    catalog = Signal(dict)
+    status = Signal(dict)
+    instances = Signal(dict)
+    available = Signal(object)
+    power_on = Signal(str, dict)
+    error = Signal(dict)
+    snipe = Signal(dict)
+    token_refreshed = Signal(str)
+    rule = Signal(object, list)
+    instance = Signal(dict)
+    startup = Signal(dict)
+    # 不来自 Watcher 事件，由界面提交的后台任务直接发出
+    analytics = Signal(dict)
+
+    def __init__(self, watcher, parent=None):
+        super().__init__(parent)
+        watcher.subscribe("catalog", self.catalog.emit)
+        watcher.subscribe("status", self.status.emit)
+        watcher.subscribe("instances", self.instances.emit)
+        watcher.subscribe("available", self.available.emit)
+        watcher.subscribe("power_on", self.power_on.emit)
+        watcher.subscribe("error", self.error.emit)
+        watcher.subscribe("snipe", self.snipe.emit)
+        watcher.subscribe("rule", self.rule.emit)
+        watcher.subscribe("instance", self.instance.emit)
+        watcher.subscribe("startup", self.startup.emit)
 
 
 class MainWindow(QMainWindow):
@@ -67,23 +94,78 @@ class MainWindow(QMainWindow):
         # 初始化变量
         self.token = ""
         self.monitored_machines = set()
-        self.current_machines = {}
-        self.current_page = 1
-        self.page_size = 4
+        # 全部机器的本地目录，表格的筛选、搜索和排序都在目录上完成
+        self.catalog = Catalog()
+        self.sort_key = None
+        self.sort_descending = False
         # 新增实例分页参数（固定）
         self.instance_page_index = 1
         self.instance_page_size = 10
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.check_status)
-        # 添加实例单选组（自动开机专用）
-        self.instance_radio_group = None
+        self.instance_max_page = 1
+        self.armed_instances = set()
+        self.threshold = 1
+        self.scope = SCOPE_MONITORED
+        self.monitoring = False
+
+        # 监控引擎在后台线程的事件循环中运行，界面只订阅它的结果
+        self.client = AutoDLClient()
+        # token 过期时用缓存的凭据自动重新登录
+        self.auth = AuthSession()
+        self.auth.load_credentials()
+        self.client.auth = self.auth
+        self.watcher = Watcher(self.client, scope=self.scope)
+        self.engine = EngineThread()
+        self.engine.start()
+        # 每次检查的结果写入本地历史库（后台线程批量写入）
+        self.history = HistoryStore()
+        self.watcher.subscribe("status", self.history.record_result)
+        # numpy 较大，第一次计算统计时才在工作线程中导入
+        self.analyzer = None
+        # 统计计算同一时间只有一个在途，期间的请求只保留最新的参数（引擎线程中使用）
+        self.analytics_running = False
+        self.analytics_args = None
+        # 上次退出时的列表和监控设置，启动时先显示
+        self.cache = SnapshotCache()
+        # 勾选等操作频繁时合并保存，目录较大时不必每次都写文件
+        self.save_timer = QTimer(self)
+        self.save_timer.setSingleShot(True)
+        self.save_timer.setInterval(1000)
+        self.save_timer.timeout.connect(self.save_snapshot)
+        self.bridge = EngineBridge(self.watcher, self)
+        self.bridge.catalog.connect(self.handle_catalog)
+        self.bridge.status.connect(self.handle_status_update)
+        self.bridge.instances.connect(self.update_instance_list)
+        self.bridge.available.connect(self.handle_available)
+        self.bridge.error.connect(self.handle_error)
+        self.bridge.snipe.connect(self.handle_snipe)
+        self.bridge.power_on.connect(self.handle_power_on)
+        self.bridge.rule.connect(self.handle_rule)
+        self.bridge.instance.connect(self.update_instance)
+        self.bridge.startup.connect(self.handle_startup)
+        self.auth.on_refresh(self.bridge.token_refreshed.emit)
+        self.bridge.token_refreshed.connect(self.handle_token_refreshed)
+        self.bridge.analytics.connect(self.update_analytics)
+        # 定期根据历史数据刷新被监控机器的可用性统计
+        self.analytics_timer = QTimer(self)
+        self.analytics_timer.timeout.connect(self.refresh_analytics)
+        self.analytics_timer.start(30 * 1000)
+        # 本地指标接口，端口被占用时不提供
+        try:
+            self.metrics_server = metrics.MetricsServer().start()
+        except OSError:
+            self.metrics_server = None
 
         # 初始化UI
         self.init_ui()
+        self.restore_snapshot()
+        self.load_rules()
+        self.notifier = self.load_notifier()
+        self.engine.call(self.notifier.attach, self.watcher)
         # 加载本地存储的 token
         self.token = self.load_token()
         if self.token:
             self.token_input.setPlainText(self.token)
+            self.client.token = self.token
             self.fetch_machines()  # token存在立即刷新机器列表
             self.fetch_instances()  # 加载实例列表
 
@@ -126,45 +208,72 @@ class MainWindow(QMainWindow):
         monitor_layout.addWidget(QLabel("监控阈值:"))
         self.threshold_combo = QComboBox()
         self.threshold_combo.addItems([str(i) for i in range(1, 9)])
+        self.threshold_combo.currentTextChanged.connect(self.update_threshold)
         monitor_layout.addWidget(self.threshold_combo)
+        # 检查范围：只拉取被监控机器所在的页，或并发拉取全部页
+        monitor_layout.addWidget(QLabel("检查范围:"))
+        self.scope_combo = QComboBox()
+        self.scope_combo.addItem("监控机器所在页", SCOPE_MONITORED)
+        self.scope_combo.addItem("全部页", SCOPE_ALL)
+        monitor_layout.addWidget(self.scope_combo)
         self.start_btn = QPushButton("开始监控")
         self.start_btn.clicked.connect(self.toggle_monitoring)
         monitor_layout.addWidget(self.start_btn)
         layout.addLayout(monitor_layout)
 
-        # 机器列表表格
-        self.table = QTableWidget()
-        self.table.setColumnCount(7)
-        self.table.setHorizontalHeaderLabels(
-            ["监控", "机器ID", "机器名称", "GPU型号", "总GPU", "空闲GPU", "状态"]
-        )
+        # 筛选区域，条件变化时直接查询本地目录
+        filter_layout = QHBoxLayout()
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("搜索名称或机器ID")
+        self.search_input.textChanged.connect(self.apply_filter)
+        filter_layout.addWidget(self.search_input)
+        self.gpu_combo = QComboBox()
+        self.gpu_combo.addItem("全部型号", None)
+        self.gpu_combo.currentIndexChanged.connect(self.apply_filter)
+        filter_layout.addWidget(self.gpu_combo)
+        self.status_combo = QComboBox()
+        self.status_combo.addItem("全部状态", None)
+        self.status_combo.addItem("有空闲卡", STATUS_FREE)
+        self.status_combo.addItem("全满", STATUS_FULL)
+        self.status_combo.addItem("离线", STATUS_OFFLINE)
+        self.status_combo.addItem("异常", STATUS_FAULT)
+        self.status_combo.currentIndexChanged.connect(self.apply_filter)
+        filter_layout.addWidget(self.status_combo)
+        filter_layout.addWidget(QLabel("空闲≥"))
+        self.min_idle_spin = QSpinBox()
+        self.min_idle_spin.setRange(0, 8)
+        self.min_idle_spin.valueChanged.connect(self.apply_filter)
+        filter_layout.addWidget(self.min_idle_spin)
+        self.monitored_only_check = QCheckBox("只看已监控")
+        self.monitored_only_check.toggled.connect(self.apply_filter)
+        filter_layout.addWidget(self.monitored_only_check)
+        self.count_label = QLabel("共 0 台")
+        filter_layout.addWidget(self.count_label)
+        layout.addLayout(filter_layout)
+
+        # 机器列表表格，由模型按快照差异增量刷新
+        self.machine_model = MachineTableModel(self.monitored_machines, self)
+        self.machine_model.monitoredChanged.connect(self.update_monitored_machines)
+        self.table = QTableView()
+        self.table.setModel(self.machine_model)
         # 设置表格禁止编辑
         self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         # 允许用户手动调整列宽（初始自动调整后切换为Interactive）
-        self.table.horizontalHeader().setSectionResizeMode(
-            QHeaderView.ResizeMode.Interactive
-        )
+        header = self.table.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
+        # 点击表头在本地目录上排序，再次点击切换升降序
+        header.setSectionsClickable(True)
+        header.setSortIndicatorShown(True)
+        header.setSortIndicator(-1, Qt.SortOrder.AscendingOrder)
+        header.sortIndicatorChanged.connect(self.sort_machines)
         layout.addWidget(self.table)
 
-        # 新增分页区域
-        pagination_layout = QHBoxLayout()
-        self.prev_button = QPushButton("上一页")
-        self.prev_button.clicked.connect(self.prev_page)
-        pagination_layout.addWidget(self.prev_button)
-        self.page_label = QLabel("第 1 页")
-        pagination_layout.addWidget(self.page_label)
-        self.next_button = QPushButton("下一页")
-        self.next_button.clicked.connect(self.next_page)
-        pagination_layout.addWidget(self.next_button)
-        layout.addLayout(pagination_layout)
-
-        # 新增实例列表区域（在机器分页下方）
+        # 新增实例列表区域（在机器列表下方）
         layout.addWidget(QLabel("实例列表"))
-        self.instance_table = QTableWidget()
-        self.instance_table.setColumnCount(5)
-        self.instance_table.setHorizontalHeaderLabels(
-            ["自动开机", "实例ID", "实例别名", "所在机器", "状态"]
-        )
+        self.instance_model = InstanceTableModel(self.armed_instances, self)
+        self.instance_model.armedChanged.connect(self.update_armed_instance)
+        self.instance_table = QTableView()
+        self.instance_table.setModel(self.instance_model)
         self.instance_table.setEditTriggers(
             QAbstractItemView.EditTrigger.NoEditTriggers
         )
@@ -172,6 +281,8 @@ class MainWindow(QMainWindow):
             QHeaderView.ResizeMode.Interactive
         )
         self.instance_table.setMinimumHeight(200)
+        # 双击实例行（复选框列除外）立即手动开机
+        self.instance_table.doubleClicked.connect(self.power_on_clicked)
         layout.addWidget(self.instance_table)
         # 新增实例分页区域
         instance_pagination_layout = QHBoxLayout()
@@ -184,24 +295,83 @@ class MainWindow(QMainWindow):
         self.instance_next_button.clicked.connect(self.instance_next_page)
         instance_pagination_layout.addWidget(self.instance_next_button)
         layout.addLayout(instance_pagination_layout)
-        # 新增：创建单选按钮组（全局只允许选择一个）
-        from PySide6.QtWidgets import QButtonGroup
-        self.instance_radio_group = QButtonGroup(self)
-        self.instance_radio_group.setExclusive(True)
 
-    def load_token(self):
+    def restore_snapshot(self):
+        """先显示缓存的列表和监控设置，之后由 fetch_machines 等在后台刷新"""
+        data = self.cache.load()
+        if not data:
+            return
+        # 模型和引擎共用这两个集合，只能原地修改
+        self.monitored_machines.update(data.get("monitored", []))
+        self.armed_instances.update(data.get("armed", []))
+        self.instance_page_index = data.get("instance_page", 1)
+        self.catalog.replace(data["machines"])
+        self.update_gpu_names()
+        self.apply_filter()
+        instances = data.get("instances", [])
+        max_page = data.get("instance_max_page", 1)
+        self.update_instance_list(
+            {"code": "Success", "data": {"list": instances, "max_page": max_page}}
+        )
+        # 自动开机需要知道实例所在的机器，不必等实例列表刷新
+        self.engine.call(self.watcher.update_instances, instances)
+        index = self.scope_combo.findData(data.get("scope", SCOPE_MONITORED))
+        self.scope_combo.setCurrentIndex(max(index, 0))
+        self.scope = self.scope_combo.currentData()
+        # 阈值变化会同步引擎设置并刷新统计
+        self.threshold_combo.setCurrentText(str(data.get("threshold", 1)))
+        self.sync_watcher()
+        self.statusBar().showMessage("显示的是上次保存的数据，正在刷新…", 5000)
+
+    def save_snapshot(self):
+        self.cache.save(
+            machines=list(self.catalog),
+            instances=self.instance_model.items,
+            monitored=sorted(self.monitored_machines),
+            armed=sorted(self.armed_instances),
+            instance_page=self.instance_page_index,
+            instance_max_page=self.instance_max_page,
+            threshold=self.threshold,
+            scope=self.scope_combo.currentData(),
+        )
+
+    def schedule_save(self):
+        self.save_timer.start()
+
+    def load_rules(self, path="rules.json"):
+        """当前目录下有规则文件时加载，格式见 rules.py"""
+        if not os.path.exists(path):
+            return
         try:
-            with open("token.txt", "r") as f:
-                return f.read().strip()
-        except Exception:
-            return ""
+            rules = load_rules(path)
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, "警告", f"读取规则文件失败: {e}")
+            return
+        # 引擎尚未开始检查，可以直接替换
+        self.watcher.rules = rules
+        self.statusBar().showMessage(f"已加载 {len(rules)} 条监控规则", 5000)
+
+    def load_notifier(self, path="notify.json"):
+        """当前目录下有 notify.json（渠道字符串列表，见 notify.py）时按其配置，
+        否则打印到标准输出并在支持的系统上弹出桌面通知"""
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    return Notifier([parse_sink(spec) for spec in json.load(f)])
+            except (OSError, ValueError) as e:
+                QMessageBox.warning(self, "警告", f"读取通知配置失败: {e}")
+        sinks = [StdoutSink()]
+        try:
+            sinks.append(DesktopSink())
+        except NotifyError as e:
+            self.statusBar().showMessage(f"{e}，只在状态栏显示通知", 10000)
+        return Notifier(sinks)
+
+    def load_token(self):
+        return load_token()
 
     def save_token(self, token):
-        try:
-            with open("token.txt", "w") as f:
-                f.write(token)
-        except Exception:
-            pass
+        save_token(token)
 
     def fetch_machines(self):
         self.token = self.token_input.toPlainText().strip()
@@ -210,250 +380,281 @@ class MainWindow(QMainWindow):
             return
         # 保存 token 到本地
         self.save_token(self.token)
-        payload = {"page_index": self.current_page, "page_size": self.page_size}
-        self.thread = RequestThread(
-            "https://private.autodl.com/api/v2/machine/list", self.token, payload
-        )
-        self.thread.finished.connect(self.update_machine_list)
-        self.thread.start()
+        self.client.token = self.token
+        # 立即刷新一次目录，之后由引擎定期在后台刷新
+        self.engine.submit(self.watcher.refresh_catalog())
+        self.engine.call(self.watcher.start_catalog)
 
-    def update_machine_list(self, result):
-        if "error" in result:
-            QMessageBox.critical(self, "错误", f"请求失败: {result['error']}")
+    def handle_catalog(self, result):
+        if "error" in result or result.get("code") != "Success":
+            metrics.UI_DROPPED.inc(view="catalog")
+            message = result.get("error") or result.get("msg", "未知错误")
+            self.statusBar().showMessage(f"刷新机器列表失败: {message}", 10000)
             return
-
-        if result.get("code") != "Success":
-            QMessageBox.warning(
-                self, "警告", f"API返回错误: {result.get('msg', '未知错误')}"
-            )
+        self.catalog.replace(result["data"]["list"])
+        self.update_gpu_names()
+        self.apply_filter()
+        self.schedule_save()
+
+    def update_gpu_names(self):
+        """用目录中出现的型号更新下拉框，保留当前选择"""
+        names = self.catalog.gpu_names()
+        current = self.gpu_combo.currentData()
+        shown = [self.gpu_combo.itemData(i) for i in range(1, self.gpu_combo.count())]
+        if names == shown:
             return
+        self.gpu_combo.blockSignals(True)
+        self.gpu_combo.clear()
+        self.gpu_combo.addItem("全部型号", None)
+        for name in names:
+            self.gpu_combo.addItem(name, name)
+        self.gpu_combo.setCurrentIndex(max(self.gpu_combo.findData(current), 0))
+        self.gpu_combo.blockSignals(False)
+
+    def sort_machines(self, column, order):
+        self.sort_key = SORT_COLUMNS.get(column)
+        self.sort_descending = order == Qt.SortOrder.DescendingOrder
+        self.apply_filter()
+
+    def apply_filter(self, *_):
+        """按筛选条件查询本地目录并刷新表格，不发起网络请求"""
+        started = time.perf_counter()
+        machines = self.catalog.query(
+            text=self.search_input.text().strip(),
+            gpu_name=self.gpu_combo.currentData(),
+            status=self.status_combo.currentData(),
+            min_idle=self.min_idle_spin.value(),
+            machine_ids=(
+                self.monitored_machines
+                if self.monitored_only_check.isChecked()
+                else None
+            ),
+            sort_key=self.sort_key,
+            descending=self.sort_descending,
+        )
+        first_fill = self.machine_model.rowCount() == 0
+        self.machine_model.set_items(machines)
+        if first_fill and machines:
+            # 首次填充时根据内容自动调整列宽，之后保留用户手动调整的宽度
+            self.table.resizeColumnsToContents()
+        self.count_label.setText(
+            f"共 {len(self.catalog)} 台，显示 {len(machines)} 台"
+        )
+        metrics.RENDER_SECONDS.observe(time.perf_counter() - started, view="machines")
+
+    def update_monitored_machines(self, machine_id, checked):
+        """复选框状态变化后同步监控列表（模型已更新 monitored_machines）"""
+        self.sync_watcher()
+        self.schedule_save()
+        if self.monitored_only_check.isChecked():
+            self.apply_filter()
+        if checked:
+            self.refresh_analytics()
+
+    def watcher_settings(self):
+        """在界面线程中复制监控设置，引擎线程不直接读取界面持有的集合"""
+        return (
+            set(self.monitored_machines),
+            set(self.armed_instances),
+            self.scope,
+            self.threshold,
+        )
 
-        self.table.blockSignals(True)
-        self.table.setRowCount(0)
-        self.current_machines.clear()
-
-        for machine in result["data"]["list"]:
-            row = self.table.rowCount()
-            self.table.insertRow(row)
-
-            # 监控复选框
-            machine_id = machine["machine_id"]
-            cb = QCheckBox()
-            cb.setChecked(machine_id in self.monitored_machines)
-            # 连接复选框状态变化信号
-            cb.stateChanged.connect(
-                lambda state, m_id=machine_id: self.update_monitored_machines(
-                    m_id, state
-                )
-            )
-            self.table.setCellWidget(row, 0, cb)
-
-            # 设置各项并居中显示
-            item_id = QTableWidgetItem(machine_id)
-            item_id.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.table.setItem(row, 1, item_id)
-
-            item_name = QTableWidgetItem(machine["machine_name"])
-            item_name.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.table.setItem(row, 2, item_name)
-
-            item_gpu = QTableWidgetItem(machine["gpu_name"])
-            item_gpu.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.table.setItem(row, 3, item_gpu)
-
-            item_total = QTableWidgetItem(str(machine["gpu"]["total"]))
-            item_total.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.table.setItem(row, 4, item_total)
-
-            item_idle = QTableWidgetItem(str(machine["gpu"]["idle"]))
-            item_idle.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.table.setItem(row, 5, item_idle)
+    def sync_watcher(self):
+        """把界面上的监控设置同步到引擎线程"""
+        self.engine.call(self.watcher.apply_settings, *self.watcher_settings())
 
-            status = self.get_status_text(machine)
-            item_status = QTableWidgetItem(status)
-            item_status.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            item_status.setForeground(self.get_status_color(machine))
-            self.table.setItem(row, 6, item_status)
+    def update_threshold(self, text):
+        self.threshold = int(text)
+        self.sync_watcher()
+        self.schedule_save()
+        self.refresh_analytics()
 
-            self.current_machines[machine_id] = machine
+    def refresh_analytics(self):
+        if self.monitored_machines:
+            self.engine.submit(
+                self.compute_analytics(list(self.monitored_machines), self.threshold)
+            )
 
-        self.table.blockSignals(False)
-        # 根据内容自动调整列宽，然后允许用户手动更改
-        self.table.resizeColumnsToContents()
-        self.table.horizontalHeader().setSectionResizeMode(
-            QHeaderView.ResizeMode.Interactive
-        )
+    async def compute_analytics(self, machine_ids, threshold):
+        # 定时器、勾选和阈值变化都会请求计算；分析器的缓存不是线程安全的，
+        # 计算在途时只记下最新的参数，结束后再按它算一次
+        self.analytics_args = (machine_ids, threshold)
+        if self.analytics_running:
+            return
+        self.analytics_running = True
+        try:
+            while self.analytics_args is not None:
+                args, self.analytics_args = self.analytics_args, None
+                # 读取历史和统计计算放到工作线程，不占用引擎循环
+                stats = await asyncio.to_thread(self.analyze, *args)
+                self.bridge.analytics.emit(stats)
+        finally:
+            self.analytics_running = False
 
-        # 更新分页按钮状态
-        self.page_label.setText(f"第 {self.current_page} 页")
-        self.prev_button.setEnabled(self.current_page > 1)
-        if len(result["data"]["list"]) < self.page_size:
-            self.next_button.setEnabled(False)
-        else:
-            self.next_button.setEnabled(True)
+    def analyze(self, machine_ids, threshold):
+        if self.analyzer is None:
+            from analytics import AvailabilityAnalyzer
 
-    def update_monitored_machines(self, machine_id, state):
-        """根据复选框状态更新监控列表"""
-        if state == Qt.CheckState.Checked.value:
-            self.monitored_machines.add(machine_id)
-        else:
-            self.monitored_machines.discard(machine_id)
+            self.analyzer = AvailabilityAnalyzer(self.history)
+        return self.analyzer.stats(machine_ids, threshold)
 
-    def get_status_text(self, machine):
-        if machine["health_status"] != 0:
-            return "异常"
-        if machine["online_status"] != 2:
-            return "离线"
-        return "有空闲卡" if machine["gpu"]["idle"] > 0 else "全满"
+    def update_analytics(self, stats):
+        self.machine_model.set_stats(stats)
 
-    def get_status_color(self, machine):
-        if machine["health_status"] != 0 or machine["online_status"] != 2:
-            return QColor(255, 0, 0)
-        return QColor(0, 200, 0) if machine["gpu"]["idle"] > 0 else QColor(255, 165, 0)
+    def update_armed_instance(self, instance_uuid, checked):
+        """复选框状态变化后同步自动开机实例（模型已更新 armed_instances）"""
+        self.sync_watcher()
+        self.schedule_save()
 
     def toggle_monitoring(self):
-        if self.timer.isActive():
-            self.timer.stop()
+        if self.monitoring:
+            self.monitoring = False
+            self.engine.call(self.watcher.stop)
             self.start_btn.setText("开始监控")
         else:
-            # 根据单位转换间隔：分钟 -> 毫秒, 秒 -> 毫秒
+            # 根据单位转换间隔：分钟 -> 秒
             value = self.interval_spin.value()
             unit = self.unit_combo.currentText()
             if unit == "分钟":
-                interval = value * 60 * 1000
+                interval = value * 60
             else:  # 秒
-                interval = value * 1000
-            self.timer.start(interval)
+                interval = value
+            self.monitoring = True
+            self.scope = self.scope_combo.currentData()
+            self.engine.call(self.start_watcher, interval, self.watcher_settings())
             self.start_btn.setText("停止监控")
-            self.check_status()  # 立即执行一次检查
 
-    def check_status(self):
-        if not self.token:
-            return
-        payload = {"page_index": self.current_page, "page_size": self.page_size}
-        self.thread = RequestThread(
-            "https://private.autodl.com/api/v2/machine/list", self.token, payload
+    def start_watcher(self, interval, settings):
+        """在引擎线程中应用界面设置并开始检查（启动后立即执行一次）"""
+        self.watcher.apply_settings(*settings)
+        self.watcher.interval = interval
+        self.watcher.start()
+
+    def handle_available(self, machine):
+        # 通知由引擎线程中的通知管道合并后发出，这里只在状态栏提示
+        message = f"{machine.machine_name} 有 {machine.gpu_idle} 个空闲GPU！"
+        self.statusBar().showMessage(message, 30000)
+
+    def handle_rule(self, rule, machines):
+        names = "、".join(machine.machine_name for machine in machines)
+        message = f"规则「{rule.name}」触发: {names}"
+        self.statusBar().showMessage(message, 30000)
+
+    def handle_error(self, result):
+        # 定时检查出错时引擎会自动退避重试，这里只在状态栏提示
+        message = result.get("error") or result.get("msg", "未知错误")
+        self.statusBar().showMessage(f"检查失败: {message}", 10000)
+
+    def handle_snipe(self, record):
+        result = "成功" if record["success"] else "失败"
+        message = (
+            f"自动开机{result}: 检测→请求 {record['detect_to_request'] * 1000:.0f}ms，"
+            f"请求→响应 {record['request_to_ack'] * 1000:.0f}ms，"
+            f"共尝试 {record['attempts']} 次"
         )
-        self.thread.finished.connect(self.handle_status_update)
-        self.thread.start()
+        print(message)
+        self.statusBar().showMessage(message, 30000)
+
+    def handle_token_refreshed(self, token):
+        # 引擎已在使用新 token，这里只更新界面和本地保存的 token
+        self.token = token
+        self.token_input.setPlainText(token)
+        self.save_token(token)
+        self.statusBar().showMessage("token 已过期，已自动重新登录", 10000)
+
+    def handle_power_on(self, instance_uuid, result):
+        if "error" not in result and result.get("code") == "Success":
+            message = f"实例 {instance_uuid} 开机请求已提交"
+        else:
+            error = result.get("error") or result.get("msg", "未知错误")
+            message = f"实例 {instance_uuid} 开机失败: {error}"
+        print(message)
+        self.statusBar().showMessage(message, 30000)
+
+    def update_instance(self, instance):
+        # 跟踪开机时只刷新该实例所在的行
+        self.instance_model.update_item(instance)
+
+    def handle_startup(self, record):
+        instance_uuid = record["instance_uuid"]
+        if record["success"]:
+            message = f"实例 {instance_uuid} 已运行，开机耗时 {record['seconds']:.0f} 秒"
+        else:
+            status = record["status"] or "未知"
+            message = f"实例 {instance_uuid} 开机后未能运行（状态: {status}）"
+            if instance_uuid in self.armed_instances:
+                message += "，将继续自动开机"
+        if record["disarmed"]:
+            # 引擎已取消该实例的自动开机，同步界面上的勾选
+            self.armed_instances.discard(instance_uuid)
+            self.instance_model.refresh_checks()
+            self.sync_watcher()
+            self.schedule_save()
+        print(message)
+        self.statusBar().showMessage(message, 30000)
 
     def handle_status_update(self, result):
         if "error" in result or result.get("code") != "Success":
+            # 错误已经通过 error 事件显示在状态栏
+            metrics.UI_DROPPED.inc(view="status")
             return
-
-        # 从下拉菜单获取监控阈值
-        threshold = int(self.threshold_combo.currentText())
-        # 获取用户在实例列表中选择自动开机的实例（如果有）
-        selected_instance = None
-        for rb in self.instance_radio_group.buttons():
-            if rb.isChecked():
-                selected_instance = rb.property("instance_uuid")
-                break
-
-        for machine in result["data"]["list"]:
-            machine_id = machine["machine_id"]
-            if (
-                machine_id in self.monitored_machines
-                and machine["gpu"]["idle"] >= threshold
-            ):
-                message = (
-                    f"{machine['machine_name']} 有 {machine['gpu']['idle']} 个空闲GPU！"
-                )
-                print(message)
-                if selected_instance:
-                    self.power_on_instance(selected_instance)
-                else:
-                    threading.Thread(
-                        target=toast,
-                        args=(message, "立即前往"),
-                        kwargs={"on_click": "https://private.autodl.com/console/machine"},
-                        daemon=True,
-                    ).start()
-
-        self.update_machine_list(result)
-
-    def prev_page(self):
-        if self.current_page > 1:
-            self.current_page -= 1
-            self.fetch_machines()
-
-    def next_page(self):
-        self.current_page += 1
-        self.fetch_machines()
+        machines = result["data"]["list"]
+        if self.scope == SCOPE_ALL:
+            self.catalog.replace(machines)
+            self.update_gpu_names()
+        else:
+            # 只拉取了部分页，更新目录中对应的机器
+            self.catalog.update(machines)
+        self.apply_filter()
 
     def fetch_instances(self):
         if not self.token:
             return
-        payload = {
-            "page_index": self.instance_page_index,
-            "page_size": self.instance_page_size,
-            "tenant_uuid": self.token,
-        }
-        self.instance_thread = RequestThread(
-            "https://private.autodl.com/api/v2/instance/list", self.token, payload
+        self.engine.submit(
+            self.watcher.fetch_instances(
+                self.instance_page_index, self.instance_page_size
+            )
         )
-        self.instance_thread.finished.connect(self.update_instance_list)
-        self.instance_thread.start()
 
     def update_instance_list(self, result):
         if "error" in result or result.get("code") != "Success":
+            metrics.UI_DROPPED.inc(view="instances")
+            message = result.get("error") or result.get("msg", "未知错误")
+            self.statusBar().showMessage(f"获取实例列表失败: {message}", 10000)
             return
-        self.instance_table.setRowCount(0)
-        # 清空上次添加的单选按钮组
-        self.instance_radio_group = QButtonGroup(self)
-        self.instance_radio_group.setExclusive(True)
-        
-        for instance in result["data"]["list"]:
-            row = self.instance_table.rowCount()
-            self.instance_table.insertRow(row)
-            # 新增：自动开机单选按钮在第一列
-            from PySide6.QtWidgets import QRadioButton
-            rb = QRadioButton()
-            rb.setProperty("instance_uuid", instance["instance_uuid"])
-            # 设置单选按钮水平居中
-            rb.setStyleSheet("margin-left:auto; margin-right:auto;")
-            # 判断状态, 状态"开机"禁用该按钮
-            status = instance.get("status", "")
-            display_status = (
-                "关机" if status == "shutdown" else "开机" if status == "running" else status
-            )
-            if display_status == "开机":
-                rb.setEnabled(False)
-            self.instance_radio_group.addButton(rb)
-            self.instance_table.setCellWidget(row, 0, rb)
-            
-            # 实例ID -> 第二列
-            item_id = QTableWidgetItem(instance["instance_uuid"])
-            item_id.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.instance_table.setItem(row, 1, item_id)
-            # 实例别名 -> 第三列
-            item_name = QTableWidgetItem(instance["instance_name"])
-            item_name.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.instance_table.setItem(row, 2, item_name)
-            # 所在机器 -> 第四列
-            item_machine = QTableWidgetItem(instance["machine_name"])
-            item_machine.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.instance_table.setItem(row, 3, item_machine)
-            # 状态 -> 第五列
-            item_status = QTableWidgetItem(display_status)
-            item_status.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            if display_status == "开机":
-                item_status.setForeground(QColor(0, 200, 0))
-            self.instance_table.setItem(row, 4, item_status)
-        
+        started = time.perf_counter()
+        instances = result["data"]["list"]
+        first_fill = self.instance_model.rowCount() == 0
+        self.instance_model.set_items(instances)
+        if first_fill and instances:
+            self.instance_table.resizeColumnsToContents()
+
         # 更新实例分页按钮状态
-        max_page = result["data"].get("max_page", 1)
+        max_page = self.instance_max_page = result["data"].get("max_page", 1)
         self.instance_page_label.setText(f"第 {self.instance_page_index} 页")
         self.instance_prev_button.setEnabled(self.instance_page_index > 1)
         self.instance_next_button.setEnabled(self.instance_page_index < max_page)
+        metrics.RENDER_SECONDS.observe(time.perf_counter() - started, view="instances")
+
+    def power_on_clicked(self, index):
+        if index.column() == 0:
+            # 第一列是自动开机复选框，双击只切换勾选
+            return
+        instance = self.instance_model.items[index.row()]
+        instance_uuid = instance["instance_uuid"]
+        if instance.get("status") == "running":
+            self.statusBar().showMessage(f"实例 {instance_uuid} 已在运行", 10000)
+            return
+        answer = QMessageBox.question(
+            self, "手动开机", f"立即开机实例 {instance_uuid}？"
+        )
+        if answer == QMessageBox.StandardButton.Yes:
+            self.power_on_instance(instance_uuid)
 
     def power_on_instance(self, instance_uuid):
-        # 发起自动开机请求
-        url = "https://private.autodl.com/api/v2/instance/power_on"
-        payload = {"instance_uuid": instance_uuid, "start_mode": "gpu"}
-        # 使用 RequestThread 发送 POST 请求，不关心返回结果
-        thread = RequestThread(url, self.token, payload)
-        thread.start()
+        # 发起手动开机请求，结果通过 power_on 事件返回
+        self.engine.submit(self.watcher.power_on(instance_uuid))
 
     def instance_prev_page(self):
         if self.instance_page_index > 1:
@@ -465,16 +666,34 @@ class MainWindow(QMainWindow):
         self.fetch_instances()
 
     def open_login_dialog(self):
-        dialog = LoginDialog(self)
+        dialog = LoginDialog(self, self.auth)
         if dialog.exec() == QDialog.DialogCode.Accepted:
             token = dialog.get_token()
             if token:
                 self.token_input.setPlainText(token)
                 self.token = token
+                self.client.token = token
                 self.save_token(token)
                 self.fetch_machines()
                 self.fetch_instances()
 
+    def closeEvent(self, event):
+        self.save_timer.stop()
+        self.save_snapshot()
+        self.engine.call(self.watcher.stop)
+        self.engine.call(self.watcher.stop_catalog)
+        # 等待已产生的通知发出，最多几秒
+        try:
+            self.engine.submit(self.notifier.close(timeout=3.0)).result(timeout=5.0)
+        except Exception:
+            pass
+        self.engine.stop()
+        self.client.close()
+        self.history.close()
+        if self.metrics_server is not None:
+            self.metrics_server.close()
+        super().closeEvent(event)
+
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
@@ -0,0 +1,304 @@
+"""进程内的运行指标，以 Prometheus 文本格式通过本地 HTTP 接口导出
+
+指标在请求线程、引擎线程和界面线程中都会更新，每个指标各用一把锁，
+更新只是一次字典查找加一次 bisect，可以放在热路径上。
+"""
+
+import bisect
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging.handlers import RotatingFileHandler
+
+# 秒，覆盖从本地调用（亚毫秒）到慢请求（数秒）的范围
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labelnames, key):
+    if not labelnames:
+        return ""
+    pairs = ",".join(
+        f'{name}="{escape(value)}"' for name, value in zip(labelnames, key)
+    )
+    return "{" + pairs + "}"
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = ""
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def key(self, labels):
+        # 标签值统一转成字符串，同一标签混用数字和字符串时也能排序输出
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        lines = self.header()
+        for key, value in items:
+            labels = format_labels(self.labelnames, key)
+            lines.append(f"{self.name}{labels} {format_value(value)}")
+        return lines
+
+    def snapshot(self):
+        with self.lock:
+            return {",".join(map(str, k)): v for k, v in self.values.items()}
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self.key(labels)] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                # [各桶计数（最后一个为 +Inf）, 总和, 次数]
+                state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        with self.lock:
+            items = sorted(
+                (key, (list(counts), total, count))
+                for key, (counts, total, count) in self.values.items()
+            )
+        lines = self.header()
+        names = self.labelnames + ("le",)
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                labels = format_labels(names, key + (format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                ",".join(map(str, k)): {"count": count, "sum": round(total, 6)}
+                for k, (_, total, count) in self.values.items()
+            }
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.add(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self.add(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.add(Histogram(name, help, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        return {metric.name: metric.snapshot() for metric in self.metrics}
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "autodl_request_seconds", "API 请求耗时（含排队后的网络往返和解码）", ["path"]
+)
+REQUESTS = REGISTRY.counter(
+    "autodl_requests_total", "API 请求数，status 为 HTTP 状态码或 network", ["path", "status"]
+)
+API_ERRORS = REGISTRY.counter(
+    "autodl_api_errors_total", "API 返回的非 Success code", ["path", "code"]
+)
+DECODE_SECONDS = REGISTRY.histogram(
+    "autodl_decode_seconds", "响应 JSON 解码耗时", ["path"]
+)
+IN_FLIGHT = REGISTRY.gauge(
+    "autodl_requests_in_flight", "正在请求线程中执行的请求数", ["pool"]
+)
+POLLS = REGISTRY.counter("autodl_polls_total", "定时检查次数", ["result"])
+POLL_SECONDS = REGISTRY.histogram("autodl_poll_seconds", "一次定时检查的耗时")
+POLL_LAG_SECONDS = REGISTRY.histogram(
+    "autodl_poll_lag_seconds", "定时检查实际开始时间比计划晚了多久"
+)
+POWER_ON = REGISTRY.counter(
+    "autodl_power_on_total", "开机请求结果", ["source", "result"]
+)
+DETECT_TO_REQUEST_SECONDS = REGISTRY.histogram(
+    "autodl_detect_to_request_seconds", "自动开机：检测到空闲卡到发出开机请求"
+)
+DETECT_TO_ACK_SECONDS = REGISTRY.histogram(
+    "autodl_detect_to_ack_seconds", "自动开机：检测到空闲卡到开机请求返回（含重试）"
+)
+RENDER_SECONDS = REGISTRY.histogram(
+    "autodl_render_seconds", "界面刷新表格的耗时", ["view"]
+)
+UI_DROPPED = REGISTRY.counter(
+    "autodl_ui_dropped_total", "界面因结果为错误而未刷新的次数", ["view"]
+)
+STARTUPS = REGISTRY.counter(
+    "autodl_startups_total", "开机请求成功后实例是否真正运行", ["source", "result"]
+)
+STARTUP_SECONDS = REGISTRY.histogram(
+    "autodl_startup_seconds",
+    "开机请求成功到实例变为运行的耗时",
+    buckets=(1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0),
+)
+UNCHANGED = REGISTRY.counter(
+    "autodl_unchanged_total",
+    "内容与上次相同而跳过的处理，stage 为 decode（响应解码）或 poll（检查结果处理）",
+    ["stage"],
+)
+NOTIFICATIONS = REGISTRY.counter(
+    "autodl_notifications_total",
+    "通知投递结果，result 为 sent / retry / failed / dropped",
+    ["sink", "result"],
+)
+NOTIFY_SECONDS = REGISTRY.histogram(
+    "autodl_notify_seconds", "通知从产生到投递成功的耗时（含合并等待和重试）", ["sink"]
+)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    registry = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MetricsServer:
+    """在后台线程中提供 GET /metrics"""
+
+    def __init__(self, registry=REGISTRY, host="127.0.0.1", port=9108):
+        handler = type("Handler", (MetricsHandler,), {"registry": registry})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, name="autodl-metrics", daemon=True
+        )
+
+    @property
+    def port(self):
+        return self.server.server_port
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class MetricsLog:
+    """每隔 interval 秒把全部指标的汇总写成一行 JSON，文件按大小滚动"""
+
+    def __init__(
+        self, path, registry=REGISTRY, interval=60.0, max_bytes=1 << 20, backups=3
+    ):
+        self.registry = registry
+        self.interval = interval
+        self.logger = logging.getLogger(f"autodl.metrics.{path}")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        self.handler = RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8"
+        )
+        self.logger.addHandler(self.handler)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(
+            target=self._run, name="autodl-metrics-log", daemon=True
+        )
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def write(self):
+        line = {"ts": time.time(), **self.registry.snapshot()}
+        self.logger.info(json.dumps(line, ensure_ascii=False))
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.write()
+
+    def close(self):
+        self.stopped.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        self.write()
+        self.logger.removeHandler(self.handler)
+        self.handler.close()
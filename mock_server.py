@@ -0,0 +1,382 @@
+"""本地模拟的 AutoDL API，用于在不访问线上服务的情况下测试和压测监控引擎
+
+    python mock_server.py --machines 1000 --latency 0.05 --error-rate 0.01
+
+实现了机器列表、实例列表、开机和登录接口，另有 /mock/* 控制接口用于
+在运行中修改机器的空闲GPU数量、查询开机记录：
+
+    POST /mock/idle      {"machine_id": "...", "idle": 2}
+    POST /mock/reset     {"idle": 0}  所有机器恢复为 idle 张空闲卡，实例全部关机
+    POST /mock/expire    使当前所有 token 失效
+    GET  /mock/stats     请求计数、开机记录（时间为服务端 perf_counter）
+
+--script 指定的 JSON 文件按时间依次修改空闲GPU数量：
+
+    [{"at": 5.0, "machine_id": "m-0003", "idle": 2}]
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from engine import INSTANCE_LIST_PATH, MACHINE_LIST_PATH, POWER_ON_PATH
+
+LOGIN_PATH = "/api/v1/new_login"
+PASSPORT_PATH = "/api/v2/login"
+
+GPU_NAMES = ["RTX 4090", "RTX 3090", "A100-SXM4-80GB", "A800", "RTX A5000"]
+REGIONS = ["西北B区", "北京A区", "内蒙A区", "重庆A区"]
+
+
+def make_machines(count, gpu_total=8, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            "machine_id": f"m-{i:04d}",
+            "machine_name": f"{rng.choice(REGIONS)} / {i:03d}机",
+            "gpu_name": rng.choice(GPU_NAMES),
+            "gpu": {"idle": 0, "total": gpu_total},
+            "online_status": 2,
+            "health_status": 0,
+        }
+        for i in range(count)
+    ]
+
+
+class MockAutoDL:
+    """模拟服务端的状态，所有方法都是线程安全的
+
+    每台机器上各有 instances_per_machine 个关机状态的实例，开机时占用
+    所在机器的空闲卡，空闲卡不够时返回失败。
+    """
+
+    def __init__(
+        self,
+        machines=100,
+        instances_per_machine=1,
+        latency=0.0,
+        jitter=0.0,
+        error_rate=0.0,
+        token=None,
+        seed=0,
+        startup=0.0,
+    ):
+        self.machines = make_machines(machines, seed=seed)
+        self.by_id = {m["machine_id"]: m for m in self.machines}
+        self.instances = []
+        for machine in self.machines:
+            for j in range(instances_per_machine):
+                self.instances.append(
+                    {
+                        "instance_uuid": f"{machine['machine_id']}-i{j}",
+                        "instance_name": f"实例{j}",
+                        "machine_id": machine["machine_id"],
+                        "machine_name": machine["machine_name"],
+                        "status": "shutdown",
+                        "req_gpu_amount": 1,
+                    }
+                )
+        self.instance_by_uuid = {i["instance_uuid"]: i for i in self.instances}
+        # 开机后经过 startup 秒才从 starting 变为 running
+        self.startup = startup
+        self.starting = {}
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        # token 为空时不校验 Authorization
+        self.tokens = {token} if token else None
+        self.tickets = set()
+        self.requests = {}
+        self.events = []
+        self.power_ons = []
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def delay(self):
+        if self.latency or self.jitter:
+            time.sleep(self.latency + self.rng.uniform(0, self.jitter))
+
+    def fail(self):
+        return self.error_rate and self.rng.random() < self.error_rate
+
+    def authorized(self, token):
+        return self.tokens is None or token in self.tokens
+
+    def count(self, path):
+        with self.lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+    def machine_list(self, payload):
+        page_index = max(1, int(payload.get("page_index", 1)))
+        page_size = max(1, int(payload.get("page_size", 10)))
+        start = (page_index - 1) * page_size
+        with self.lock:
+            machines = [
+                {**m, "gpu": dict(m["gpu"])}
+                for m in self.machines[start : start + page_size]
+            ]
+        return page_response(machines, page_index, page_size, len(self.machines))
+
+    def instance_list(self, payload):
+        page_index = max(1, int(payload.get("page_index", 1)))
+        page_size = max(1, int(payload.get("page_size", 10)))
+        start = (page_index - 1) * page_size
+        with self.lock:
+            self.promote_started()
+            instances = [dict(i) for i in self.instances[start : start + page_size]]
+        return page_response(instances, page_index, page_size, len(self.instances))
+
+    def power_on(self, payload):
+        received = time.perf_counter()
+        instance_uuid = payload.get("instance_uuid")
+        with self.lock:
+            instance = self.instance_by_uuid.get(instance_uuid)
+            if instance is None:
+                return {"code": "InstanceNotFound", "msg": "实例不存在"}
+            machine = self.by_id[instance["machine_id"]]
+            need = instance["req_gpu_amount"]
+            success = instance["status"] != "running" and machine["gpu"]["idle"] >= need
+            if success:
+                machine["gpu"]["idle"] -= need
+                if self.startup:
+                    instance["status"] = "starting"
+                    self.starting[instance_uuid] = time.monotonic()
+                else:
+                    instance["status"] = "running"
+            self.power_ons.append(
+                {"instance_uuid": instance_uuid, "at": received, "success": success}
+            )
+        if not success:
+            return {"code": "InsufficientGpu", "msg": "GPU 不足"}
+        return {"code": "Success", "data": None, "msg": ""}
+
+    def promote_started(self):
+        now = time.monotonic()
+        for instance_uuid, started in list(self.starting.items()):
+            if now - started >= self.startup:
+                self.instance_by_uuid[instance_uuid]["status"] = "running"
+                del self.starting[instance_uuid]
+
+    def login(self, payload):
+        if not payload.get("phone") or not payload.get("password"):
+            return {"code": "LoginFailed", "msg": "账号或密码错误"}
+        ticket = uuid.uuid4().hex
+        with self.lock:
+            self.tickets.add(ticket)
+        return {"code": "Success", "data": {"ticket": ticket}}
+
+    def passport(self, payload):
+        token = uuid.uuid4().hex
+        with self.lock:
+            if payload.get("ticket") not in self.tickets:
+                return {"code": "TicketInvalid", "msg": "ticket 无效"}
+            self.tickets.discard(payload["ticket"])
+            if self.tokens is not None:
+                self.tokens.add(token)
+        return {"code": "Success", "data": {"token": token}}
+
+    def set_idle(self, machine_id, idle):
+        with self.lock:
+            machine = self.by_id[machine_id]
+            machine["gpu"]["idle"] = max(0, min(int(idle), machine["gpu"]["total"]))
+            self.events.append(
+                {"machine_id": machine_id, "idle": idle, "at": time.perf_counter()}
+            )
+
+    def reset(self, idle=0):
+        with self.lock:
+            for machine in self.machines:
+                machine["gpu"]["idle"] = idle
+            for instance in self.instances:
+                instance["status"] = "shutdown"
+            self.starting.clear()
+
+    def expire_tokens(self):
+        with self.lock:
+            if self.tokens is not None:
+                self.tokens.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "requests": dict(self.requests),
+                "events": list(self.events),
+                "power_ons": list(self.power_ons),
+                "now": time.perf_counter(),
+            }
+
+    def run_script(self, events):
+        """在后台线程中按 at（秒，从调用时算起）依次修改空闲GPU数量"""
+
+        def run():
+            started = time.monotonic()
+            for event in sorted(events, key=lambda e: e["at"]):
+                time.sleep(max(0.0, started + event["at"] - time.monotonic()))
+                self.set_idle(event["machine_id"], event["idle"])
+
+        thread = threading.Thread(target=run, name="mock-script", daemon=True)
+        thread.start()
+        return thread
+
+
+def page_response(items, page_index, page_size, total):
+    return {
+        "code": "Success",
+        "data": {
+            "list": items,
+            "page_index": page_index,
+            "page_size": page_size,
+            "max_page": max(1, -(-total // page_size)),
+            "result_total": total,
+        },
+        "msg": "",
+    }
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    # 与客户端保持 keep-alive 连接，和线上一样复用连接
+    protocol_version = "HTTP/1.1"
+    # 响应头和响应体分两次写入，不关闭 Nagle 时每个请求会多等一个延迟 ACK
+    disable_nagle_algorithm = True
+    api = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, data, status=200, headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return {}
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        if self.path == "/mock/stats":
+            self.send_json(self.api.stats())
+        else:
+            self.send_json({"code": "NotFound", "msg": self.path}, 404)
+
+    def do_POST(self):
+        api = self.api
+        payload = self.read_json()
+        api.count(self.path)
+
+        if self.path.startswith("/mock/"):
+            self.control(payload)
+            return
+        if self.path == LOGIN_PATH:
+            self.send_json(api.login(payload))
+            return
+        if self.path == PASSPORT_PATH:
+            self.send_json(api.passport(payload))
+            return
+
+        routes = {
+            MACHINE_LIST_PATH: api.machine_list,
+            INSTANCE_LIST_PATH: api.instance_list,
+            POWER_ON_PATH: api.power_on,
+        }
+        handler = routes.get(self.path)
+        if handler is None:
+            self.send_json({"code": "NotFound", "msg": self.path}, 404)
+            return
+        api.delay()
+        if not api.authorized(self.headers.get("Authorization")):
+            self.send_json({"code": "AuthorizeFailed", "msg": "登录已过期"})
+        elif api.fail():
+            self.send_json({"code": "InternalError", "msg": "模拟错误"}, 500)
+        else:
+            self.send_json(handler(payload))
+
+    def control(self, payload):
+        api = self.api
+        try:
+            if self.path == "/mock/idle":
+                api.set_idle(payload["machine_id"], payload["idle"])
+            elif self.path == "/mock/reset":
+                api.reset(payload.get("idle", 0))
+            elif self.path == "/mock/expire":
+                api.expire_tokens()
+            else:
+                self.send_json({"code": "NotFound", "msg": self.path}, 404)
+                return
+        except (KeyError, ValueError) as e:
+            self.send_json({"code": "InvalidParams", "msg": str(e)}, 400)
+            return
+        self.send_json({"code": "Success", "data": None})
+
+
+def serve(api, host="127.0.0.1", port=0):
+    """在后台线程中启动服务，返回 server；server.server_port 为实际端口"""
+    handler = type("Handler", (MockHandler,), {"api": api})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(
+        target=server.serve_forever, name="mock-autodl", daemon=True
+    ).start()
+    return server
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="本地模拟的 AutoDL API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000, help="0 表示随机端口")
+    parser.add_argument("--machines", type=int, default=100, help="机器数量")
+    parser.add_argument("--instances", type=int, default=1, help="每台机器上的实例数")
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的固定延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="额外的随机延迟上限（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 HTTP 500 的比例")
+    parser.add_argument("--token", default=None, help="只接受该 token 和登录得到的 token")
+    parser.add_argument("--script", default=None, help="空闲GPU变化脚本（JSON）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--startup", type=float, default=0.0, help="实例开机后多少秒变为运行")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    api = MockAutoDL(
+        args.machines,
+        instances_per_machine=args.instances,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        token=args.token,
+        seed=args.seed,
+        startup=args.startup,
+    )
+    server = serve(api, args.host, args.port)
+    # 第一行输出地址，便于脚本在随机端口下获取
+    print(f"http://{args.host}:{server.server_port}", flush=True)
+    if args.script:
+        with open(args.script, "r", encoding="utf-8") as f:
+            api.run_script(json.load(f))
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
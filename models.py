@@ -0,0 +1,328 @@
+from PySide6.QtCore import QAbstractTableModel, QModelIndex, Qt, Signal
+from PySide6.QtGui import QColor
+
+from records import STATUS_FAULT, STATUS_FREE, STATUS_FULL, STATUS_OFFLINE
+
+WEEKDAYS = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"]
+
+STATUS_TEXT = {
+    STATUS_FAULT: "异常",
+    STATUS_OFFLINE: "离线",
+    STATUS_FREE: "有空闲卡",
+    STATUS_FULL: "全满",
+}
+STATUS_COLOR = {
+    STATUS_FAULT: QColor(255, 0, 0),
+    STATUS_OFFLINE: QColor(255, 0, 0),
+    STATUS_FREE: QColor(0, 200, 0),
+    STATUS_FULL: QColor(255, 165, 0),
+}
+
+
+def get_status_text(machine):
+    return STATUS_TEXT[machine.status]
+
+
+def get_status_color(machine):
+    return STATUS_COLOR[machine.status]
+
+
+def format_hour_of_week(how):
+    """analytics 中从周一 0 点起的小时序号 -> 显示文本"""
+    return f"{WEEKDAYS[how // 24]} {how % 24:02d}时"
+
+
+def format_duration(seconds):
+    if seconds >= 3600:
+        return f"{seconds / 3600:.1f}小时"
+    if seconds >= 60:
+        return f"{seconds / 60:.0f}分钟"
+    return f"{seconds:.0f}秒"
+
+
+def format_stats(stats):
+    """把 analytics.availability_stats 的结果格式化为表格中的四列"""
+    if stats is None:
+        return ("", "", "", "")
+    peak = stats["peak_hour"]
+    forecast = stats["forecast"]
+    return (
+        f"{stats['ratio']:.0%}",
+        format_hour_of_week(peak) if peak is not None else "-",
+        format_duration(stats["mean_window"]),
+        f"{forecast:.0%}" if forecast is not None else "-",
+    )
+
+
+INSTANCE_STATUS_TEXT = {
+    "shutdown": "关机",
+    "running": "开机",
+    "starting": "开机中",
+    "shutting_down": "关机中",
+}
+
+
+def instance_display_status(instance):
+    status = instance.get("status", "")
+    return INSTANCE_STATUS_TEXT.get(status, status)
+
+
+class KeyedTableModel(QAbstractTableModel):
+    """按主键对比新旧快照的表格模型，只对变化的单元格发出 dataChanged
+
+    子类需要定义 headers、key(item) 和 cells(item)，第 0 列为勾选列。
+    """
+
+    headers = []
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.items = []
+        self.row_cells = []
+        self.rows = {}
+
+    def key(self, item):
+        raise NotImplementedError
+
+    def cells(self, item):
+        """返回第 1 列开始的显示文本，用于比较是否需要重绘"""
+        raise NotImplementedError
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.items)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if (
+            orientation == Qt.Orientation.Horizontal
+            and role == Qt.ItemDataRole.DisplayRole
+        ):
+            return self.headers[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row, column = index.row(), index.column()
+        if role == Qt.ItemDataRole.DisplayRole and column > 0:
+            return self.row_cells[row][column - 1]
+        if role == Qt.ItemDataRole.TextAlignmentRole:
+            return Qt.AlignmentFlag.AlignCenter
+        if role == Qt.ItemDataRole.CheckStateRole and column == 0:
+            checked = self.is_checked(self.items[row])
+            return Qt.CheckState.Checked if checked else Qt.CheckState.Unchecked
+        if role == Qt.ItemDataRole.ForegroundRole:
+            return self.foreground(self.items[row], column)
+        return None
+
+    def is_checked(self, item):
+        return False
+
+    def foreground(self, item, column):
+        return None
+
+    def item(self, key):
+        row = self.rows.get(key)
+        return None if row is None else self.items[row]
+
+    def set_items(self, items):
+        """用新的快照更新模型：删除消失的行、追加新行、调整顺序，再比较单元格"""
+        new_keys = [self.key(item) for item in items]
+        new_items = dict(zip(new_keys, items))
+
+        # 删除不再出现的行，从后往前删保证行号有效
+        for row in range(len(self.items) - 1, -1, -1):
+            if self.key(self.items[row]) not in new_items:
+                self.beginRemoveRows(QModelIndex(), row, row)
+                del self.items[row]
+                del self.row_cells[row]
+                self.endRemoveRows()
+        self.rows = {self.key(item): row for row, item in enumerate(self.items)}
+
+        # 新增的行追加到末尾
+        added = [key for key in new_keys if key not in self.rows]
+        if added:
+            first = len(self.items)
+            self.beginInsertRows(QModelIndex(), first, first + len(added) - 1)
+            for key in added:
+                self.rows[key] = len(self.items)
+                self.items.append(new_items[key])
+                self.row_cells.append(self.cells(new_items[key]))
+            self.endInsertRows()
+
+        # 顺序不一致时整体重排，保持选中等持久索引
+        if [self.key(item) for item in self.items] != new_keys:
+            self.layoutAboutToBeChanged.emit()
+            old_keys = [self.key(item) for item in self.items]
+            self.items = [self.items[self.rows[key]] for key in new_keys]
+            self.row_cells = [self.row_cells[self.rows[key]] for key in new_keys]
+            self.rows = {key: row for row, key in enumerate(new_keys)}
+            old_indexes = self.persistentIndexList()
+            self.changePersistentIndexList(
+                old_indexes,
+                [
+                    self.index(self.rows[old_keys[index.row()]], index.column())
+                    for index in old_indexes
+                ],
+            )
+            self.layoutChanged.emit()
+
+        # 逐行比较单元格，只通知变化的列范围
+        for row, key in enumerate(new_keys):
+            item = new_items[key]
+            cells = self.cells(item)
+            old_cells = self.row_cells[row]
+            self.items[row] = item
+            if cells == old_cells:
+                continue
+            changed = [i for i, (a, b) in enumerate(zip(cells, old_cells)) if a != b]
+            self.row_cells[row] = cells
+            self.dataChanged.emit(
+                self.index(row, changed[0] + 1), self.index(row, changed[-1] + 1)
+            )
+
+    def update_item(self, item):
+        """只更新已有的一行（如跟踪开机时查询到的单个实例），不在表格中时忽略"""
+        row = self.rows.get(self.key(item))
+        if row is None:
+            return False
+        self.items[row] = item
+        cells = self.cells(item)
+        if cells != self.row_cells[row]:
+            self.row_cells[row] = cells
+            self.dataChanged.emit(self.index(row, 0), self.index(row, len(cells)))
+        return True
+
+    def refresh_checks(self):
+        if self.items:
+            self.dataChanged.emit(
+                self.index(0, 0),
+                self.index(len(self.items) - 1, 0),
+                [Qt.ItemDataRole.CheckStateRole],
+            )
+
+
+class MachineTableModel(KeyedTableModel):
+    headers = [
+        "监控",
+        "机器ID",
+        "机器名称",
+        "GPU型号",
+        "总GPU",
+        "空闲GPU",
+        "可用率",
+        "常见空闲时段",
+        "平均空闲时长",
+        "下一小时概率",
+        "状态",
+    ]
+    STATUS_COLUMN = 10
+
+    # 用户勾选/取消监控时发出 (machine_id, checked)
+    monitoredChanged = Signal(str, bool)
+
+    def __init__(self, monitored_machines, parent=None):
+        super().__init__(parent)
+        self.monitored_machines = monitored_machines
+        # 被监控机器的历史可用性统计 {machine_id: stats}
+        self.stats = {}
+
+    def key(self, machine):
+        return machine.machine_id
+
+    def cells(self, machine):
+        return (
+            machine.machine_id,
+            machine.machine_name,
+            machine.gpu_name,
+            str(machine.gpu_total),
+            str(machine.gpu_idle),
+            *format_stats(self.stats.get(machine.machine_id)),
+            get_status_text(machine),
+        )
+
+    def is_checked(self, machine):
+        return machine.machine_id in self.monitored_machines
+
+    def foreground(self, machine, column):
+        if column == self.STATUS_COLUMN:
+            return get_status_color(machine)
+        return None
+
+    def flags(self, index):
+        flags = Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+        if index.column() == 0:
+            flags |= Qt.ItemFlag.ItemIsUserCheckable
+        return flags
+
+    def set_stats(self, stats):
+        # 统计列也参与单元格比较，重新对比当前行即可只刷新变化的单元格
+        self.stats = stats
+        self.set_items(list(self.items))
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if role != Qt.ItemDataRole.CheckStateRole or index.column() != 0:
+            return False
+        machine_id = self.items[index.row()].machine_id
+        checked = Qt.CheckState(value) == Qt.CheckState.Checked
+        if checked:
+            self.monitored_machines.add(machine_id)
+        else:
+            self.monitored_machines.discard(machine_id)
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.CheckStateRole])
+        self.monitoredChanged.emit(machine_id, checked)
+        return True
+
+
+class InstanceTableModel(KeyedTableModel):
+    headers = ["自动开机", "实例ID", "实例别名", "所在机器", "状态"]
+
+    # 用户勾选/取消自动开机时发出 (instance_uuid, checked)
+    armedChanged = Signal(str, bool)
+
+    def __init__(self, armed_instances, parent=None):
+        super().__init__(parent)
+        self.armed_instances = armed_instances
+
+    def key(self, instance):
+        return instance["instance_uuid"]
+
+    def cells(self, instance):
+        return (
+            instance["instance_uuid"],
+            instance["instance_name"],
+            instance["machine_name"],
+            instance_display_status(instance),
+        )
+
+    def is_checked(self, instance):
+        return instance["instance_uuid"] in self.armed_instances
+
+    def foreground(self, instance, column):
+        if column == 4 and instance_display_status(instance) == "开机":
+            return QColor(0, 200, 0)
+        return None
+
+    def flags(self, index):
+        flags = Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+        if index.column() == 0:
+            flags |= Qt.ItemFlag.ItemIsUserCheckable
+            # 已开机的实例不能选择自动开机
+            if instance_display_status(self.items[index.row()]) == "开机":
+                flags &= ~Qt.ItemFlag.ItemIsEnabled
+        return flags
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if role != Qt.ItemDataRole.CheckStateRole or index.column() != 0:
+            return False
+        instance_uuid = self.items[index.row()]["instance_uuid"]
+        checked = Qt.CheckState(value) == Qt.CheckState.Checked
+        if checked:
+            self.armed_instances.add(instance_uuid)
+        else:
+            self.armed_instances.discard(instance_uuid)
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.CheckStateRole])
+        self.armedChanged.emit(instance_uuid, checked)
+        return True
@@ -0,0 +1,276 @@
+"""通知管道：把空闲GPU和规则触发等事件合并后异步投递到多个通知渠道
+
+事件在引擎事件循环中产生，batch_window 秒内的事件合并成一条通知；每个渠道
+有自己的有界队列和投递任务，阻塞的发送（HTTP、SMTP）放到线程中执行，
+不会拖慢定时检查。发送失败按指数退避重试，队列满时丢弃最旧的通知。
+
+渠道用字符串指定（daemon.py 的 --notify，界面的 notify.json）:
+    stdout            打印到标准输出
+    log:路径          追加写入按大小滚动的日志文件
+    webhook:URL       POST JSON {"title", "text", "messages"}
+    smtp:收件人        通过本地 SMTP 服务器发送邮件，多个收件人用逗号分隔
+    desktop           桌面通知：Windows 使用 win11toast，Linux 使用 notify-send
+"""
+
+import asyncio
+import logging
+import platform
+import shutil
+import smtplib
+import subprocess
+import time
+from email.message import EmailMessage
+from logging.handlers import RotatingFileHandler
+
+import requests
+
+import metrics
+from rules import ACTION_NOTIFY
+
+CONSOLE_URL = "https://private.autodl.com/console/machine"
+
+
+class NotifyError(ValueError):
+    pass
+
+
+class Notification:
+    __slots__ = ("title", "messages", "created_at")
+
+    def __init__(self, title, messages, created_at):
+        self.title = title
+        self.messages = messages
+        # 第一条事件产生的时刻（time.monotonic()），用于统计投递延迟
+        self.created_at = created_at
+
+    @property
+    def text(self):
+        return "\n".join(self.messages)
+
+
+class StdoutSink:
+    name = "stdout"
+
+    def send(self, notification):
+        print(notification.text, flush=True)
+
+
+class LogSink:
+    name = "log"
+
+    def __init__(self, path, max_bytes=1 << 20, backups=3):
+        self.logger = logging.getLogger(f"autodl.notify.{path}")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        handler = RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8"
+        )
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        self.logger.addHandler(handler)
+
+    def send(self, notification):
+        for message in notification.messages:
+            self.logger.info(message)
+
+
+class WebhookSink:
+    name = "webhook"
+
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def send(self, notification):
+        response = self.session.post(
+            self.url,
+            json={
+                "title": notification.title,
+                "text": notification.text,
+                "messages": notification.messages,
+            },
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+
+
+class SmtpSink:
+    name = "smtp"
+
+    def __init__(self, recipients, host="localhost", port=25, sender=None, timeout=10):
+        self.recipients = list(recipients)
+        self.host = host
+        self.port = port
+        self.sender = sender or "autodl-watcher@localhost"
+        self.timeout = timeout
+
+    def send(self, notification):
+        message = EmailMessage()
+        message["Subject"] = notification.title
+        message["From"] = self.sender
+        message["To"] = ", ".join(self.recipients)
+        message.set_content(f"{notification.text}\n\n{CONSOLE_URL}\n")
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            smtp.send_message(message)
+
+
+class DesktopSink:
+    name = "desktop"
+
+    def __init__(self, link=CONSOLE_URL):
+        self.link = link
+        self.windows = platform.system() == "Windows"
+        if not self.windows and shutil.which("notify-send") is None:
+            raise NotifyError("桌面通知需要 win11toast（Windows）或 notify-send（Linux）")
+
+    def send(self, notification):
+        if self.windows:
+            # 通知库较大，第一次弹出通知时才加载；notify 不等待用户关闭通知
+            from win11toast import notify
+
+            notify(notification.title, notification.text, on_click=self.link)
+        else:
+            command = ["notify-send", "-a", "AutoDL Watcher"]
+            command += [notification.title, notification.text]
+            subprocess.run(command, check=True, timeout=10)
+
+
+def parse_sink(spec, smtp_host="localhost", smtp_port=25):
+    """按字符串创建通知渠道，格式见模块说明"""
+    kind, _, arg = spec.partition(":")
+    if kind == "stdout" and not arg:
+        return StdoutSink()
+    if kind == "desktop" and not arg:
+        return DesktopSink()
+    if kind == "log" and arg:
+        return LogSink(arg)
+    if kind == "webhook" and arg:
+        return WebhookSink(arg)
+    if kind == "smtp" and arg:
+        return SmtpSink(arg.split(","), host=smtp_host, port=smtp_port)
+    raise NotifyError(f"无法识别的通知渠道: {spec!r}")
+
+
+class SinkWorker:
+    """一个渠道的有界队列和投递任务"""
+
+    def __init__(self, sink, max_queue, retries, retry_delay):
+        self.sink = sink
+        self.queue = asyncio.Queue(max_queue)
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.task = None
+
+    def put(self, notification):
+        if self.queue.full():
+            # 渠道长时间不可用时只保留最新的通知
+            self.queue.get_nowait()
+            self.queue.task_done()
+            metrics.NOTIFICATIONS.inc(sink=self.sink.name, result="dropped")
+        self.queue.put_nowait(notification)
+        if self.task is None or self.task.done():
+            self.task = asyncio.ensure_future(self.run())
+
+    async def run(self):
+        while True:
+            notification = await self.queue.get()
+            try:
+                await self.deliver(notification)
+            finally:
+                self.queue.task_done()
+
+    async def deliver(self, notification):
+        name = self.sink.name
+        for attempt in range(self.retries + 1):
+            try:
+                await asyncio.to_thread(self.sink.send, notification)
+            except Exception as e:
+                if attempt == self.retries:
+                    metrics.NOTIFICATIONS.inc(sink=name, result="failed")
+                    print(f"通知发送失败（{name}）: {e}", flush=True)
+                    return False
+                metrics.NOTIFICATIONS.inc(sink=name, result="retry")
+                await asyncio.sleep(self.retry_delay * 2**attempt)
+            else:
+                metrics.NOTIFICATIONS.inc(sink=name, result="sent")
+                metrics.NOTIFY_SECONDS.observe(
+                    time.monotonic() - notification.created_at, sink=name
+                )
+                return True
+
+
+class Notifier:
+    """合并同一时刻的事件并分发到各渠道，所有方法都需在事件循环线程中调用"""
+
+    def __init__(
+        self, sinks=(), batch_window=0.2, max_queue=100, retries=3, retry_delay=2.0
+    ):
+        self.batch_window = batch_window
+        self.workers = [
+            SinkWorker(sink, max_queue, retries, retry_delay) for sink in sinks
+        ]
+        self.pending = []
+        self.pending_since = None
+        self._flush_handle = None
+
+    def __len__(self):
+        return len(self.workers)
+
+    def notify(self, message):
+        if not self.workers:
+            return
+        if not self.pending:
+            self.pending_since = time.monotonic()
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(self.batch_window, self.flush)
+        self.pending.append(message)
+
+    def flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self.pending:
+            return
+        messages, self.pending = self.pending, []
+        if len(messages) == 1:
+            title = "AutoDL Watcher"
+        else:
+            title = f"AutoDL Watcher: {len(messages)} 条通知"
+        notification = Notification(title, messages, self.pending_since)
+        for worker in self.workers:
+            worker.put(notification)
+
+    def attach(self, watcher, name=""):
+        """订阅 watcher 的空闲GPU和通知类规则事件，name 为多账号时的账号名"""
+        prefix = f"[{name}] " if name else ""
+
+        def on_available(machine):
+            # 该机器上有自动开机的实例时由引擎负责开机，不再通知
+            if machine.machine_id in watcher.machine_instances:
+                return
+            self.notify(
+                f"{prefix}{machine.machine_name} 有 {machine.gpu_idle} 个空闲GPU！"
+            )
+
+        def on_rule(rule, machines):
+            if rule.action[0] != ACTION_NOTIFY:
+                return
+            names = "、".join(machine.machine_name for machine in machines)
+            self.notify(f"{prefix}规则「{rule.name}」触发: {names}")
+
+        watcher.subscribe("available", on_available)
+        watcher.subscribe("rule", on_rule)
+
+    async def close(self, timeout=5.0):
+        """发出尚未合并的事件，最多等待 timeout 秒让队列中的通知投递完"""
+        self.flush()
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(worker.queue.join() for worker in self.workers)),
+                timeout,
+            )
+        except asyncio.TimeoutError:
+            pass
+        for worker in self.workers:
+            if worker.task is not None:
+                worker.task.cancel()
@@ -0,0 +1,53 @@
+import time
+
+
+class PageIndex:
+    """记录每台机器位于机器列表的第几页，用于只拉取包含被监控机器的页"""
+
+    def __init__(self, page_size=20, ttl=600):
+        self.page_size = page_size
+        # 超过 ttl 秒未重建时认为目录可能已经变动
+        self.ttl = ttl
+        self.pages = {}
+        self.built_at = 0.0
+
+    def __len__(self):
+        return len(self.pages)
+
+    @property
+    def expired(self):
+        return time.monotonic() - self.built_at > self.ttl
+
+    def rebuild(self, machines):
+        """根据全量快照（按页顺序排列的机器列表）重建索引"""
+        self.pages = {
+            machine.machine_id: i // self.page_size + 1
+            for i, machine in enumerate(machines)
+        }
+        self.built_at = time.monotonic()
+
+    def lookup(self, machine_ids):
+        """返回 (需要拉取的页集合, 索引中找不到的机器ID集合)"""
+        pages = set()
+        missing = set()
+        for machine_id in machine_ids:
+            page = self.pages.get(machine_id)
+            if page is None:
+                missing.add(machine_id)
+            else:
+                pages.add(page)
+        return pages, missing
+
+    def update_page(self, page_index, machines):
+        """用单页响应校正索引，返回预期在该页却已不在的机器ID"""
+        seen = {machine.machine_id for machine in machines}
+        moved = {
+            machine_id
+            for machine_id, page in self.pages.items()
+            if page == page_index and machine_id not in seen
+        }
+        for machine_id in moved:
+            del self.pages[machine_id]
+        for machine_id in seen:
+            self.pages[machine_id] = page_index
+        return moved
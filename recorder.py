@@ -0,0 +1,58 @@
+"""把客户端发出的每个请求和响应记录到 gzip 压缩的 JSON 行文件，供 replay.py 回放"""
+
+import gzip
+import json
+import threading
+import time
+
+# 记录中去掉的请求参数（实例列表用 token 作为 tenant_uuid）
+REDACTED = ("tenant_uuid",)
+
+
+class Recorder:
+    """把请求和响应追加写入 gzip 压缩的 JSON 行文件，可在多个请求线程中调用
+
+    每次打开都在文件末尾追加一个新的 gzip 成员，进程中途退出只会损坏最后一段，
+    读取时丢弃即可。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = gzip.open(path, "at", encoding="utf-8")
+        self.lock = threading.Lock()
+
+    def record(self, path, payload, status=None, body=None, error=None, elapsed=0.0):
+        entry = {
+            "t": time.time(),
+            "path": path,
+            "payload": {k: v for k, v in payload.items() if k not in REDACTED},
+            "status": status,
+            "elapsed": elapsed,
+        }
+        if body is not None:
+            entry["body"] = body
+        if error is not None:
+            entry["error"] = error
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self.lock:
+            self.file.write(line)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+def read_log(path):
+    """按时间顺序返回记录，忽略文件末尾未写完的部分"""
+    entries = []
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    break
+    except (EOFError, gzip.BadGzipFile):
+        pass
+    entries.sort(key=lambda entry: entry["t"])
+    return entries
@@ -0,0 +1,100 @@
+"""机器列表响应解码后的紧凑记录
+
+API 返回的每台机器是一个包含几十个字段的嵌套字典，监控只用到其中几项。
+解码时只保留这些字段并一次性算出状态，之后通知、界面、历史记录都直接
+读取属性，不再保留和遍历原始字典。
+"""
+
+# 机器状态，解码时根据健康状态、在线状态和空闲GPU数量计算
+STATUS_FAULT = "fault"
+STATUS_OFFLINE = "offline"
+STATUS_FREE = "free"
+STATUS_FULL = "full"
+
+
+def classify(online_status, health_status, gpu_idle):
+    if health_status != 0:
+        return STATUS_FAULT
+    if online_status != 2:
+        return STATUS_OFFLINE
+    return STATUS_FREE if gpu_idle > 0 else STATUS_FULL
+
+
+class Machine:
+    __slots__ = (
+        "machine_id",
+        "machine_name",
+        "gpu_name",
+        "gpu_idle",
+        "gpu_total",
+        "online_status",
+        "health_status",
+        "status",
+    )
+
+    def __init__(
+        self,
+        machine_id,
+        machine_name,
+        gpu_name,
+        gpu_idle,
+        gpu_total,
+        online_status,
+        health_status,
+    ):
+        self.machine_id = machine_id
+        self.machine_name = machine_name
+        self.gpu_name = gpu_name
+        self.gpu_idle = gpu_idle
+        self.gpu_total = gpu_total
+        self.online_status = online_status
+        self.health_status = health_status
+        self.status = classify(online_status, health_status, gpu_idle)
+
+    @classmethod
+    def from_api(cls, data):
+        gpu = data["gpu"]
+        return cls(
+            data["machine_id"],
+            data["machine_name"],
+            data["gpu_name"],
+            gpu["idle"],
+            gpu["total"],
+            data["online_status"],
+            data["health_status"],
+        )
+
+    def fields(self):
+        """构造参数，按 __init__ 的顺序"""
+        return (
+            self.machine_id,
+            self.machine_name,
+            self.gpu_name,
+            self.gpu_idle,
+            self.gpu_total,
+            self.online_status,
+            self.health_status,
+        )
+
+    def __repr__(self):
+        return (
+            f"Machine({self.machine_id!r}, {self.machine_name!r}, "
+            f"idle={self.gpu_idle}/{self.gpu_total}, status={self.status!r})"
+        )
+
+
+def fingerprint(machines):
+    """机器列表的指纹，只取决于解码后保留的字段，响应中其它字段变化不影响"""
+    return hash(tuple(machine.fields() for machine in machines))
+
+
+def decode_machine_list(result):
+    """把成功的机器列表响应中的 list 替换为 Machine 记录，其余字段保持不变
+
+    同时在 result["fingerprint"] 中记录该页的指纹，用于判断两次检查之间是否有变化
+    """
+    if result.get("code") == "Success" and result.get("data"):
+        data = result["data"]
+        data["list"] = [Machine.from_api(m) for m in data.get("list") or ()]
+        result["fingerprint"] = fingerprint(data["list"])
+    return result
@@ -0,0 +1,251 @@
+"""离线回放记录的 API 流量
+
+记录: daemon.py --record traffic.jsonl.gz 把客户端发出的每个请求和响应
+（不含 token）追加写入 gzip 压缩的 JSON 行文件，见 recorder.py。
+
+回放: 按记录的时间顺序把机器列表响应重新解码、合并成快照，交给 Watcher
+处理，规则、通知和自动开机判断都与在线时相同，不访问网络:
+
+    python replay.py traffic.jsonl.gz --speed 100 --rules rules.json --machine <机器ID>
+
+--speed 为回放倍速，0 表示不等待、尽快处理。冷却时间等都按记录中的时间计算，
+相同的日志和设置每次得到相同的结果。
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from daemon import build_notifier, read_rules, subscribe_output
+from engine import (
+    INSTANCE_LIST_PATH,
+    MACHINE_LIST_PATH,
+    POWER_ON_PATH,
+    Watcher,
+    merge_pages,
+)
+from records import decode_machine_list
+from recorder import read_log
+
+# 间隔小于该值（秒）且没有重复页的机器列表响应视为同一次检查
+BURST = 0.5
+
+
+def payload_key(path, payload):
+    return path, json.dumps(payload, sort_keys=True)
+
+
+def decode_entry(entry):
+    """把一条记录还原为客户端会返回的结果"""
+    if "error" in entry:
+        return {"error": entry["error"]}
+    if entry["status"] is not None and entry["status"] >= 400:
+        return {"error": f"HTTP {entry['status']}", "status": entry["status"]}
+    try:
+        result = json.loads(entry["body"])
+    except (TypeError, ValueError) as e:
+        return {"error": str(e), "status": entry["status"]}
+    if not isinstance(result, dict):
+        error = f"响应不是 JSON 对象: {type(result).__name__}"
+        return {"error": error, "status": entry["status"]}
+    if entry["path"] == MACHINE_LIST_PATH:
+        try:
+            result = decode_machine_list(result)
+        except (AttributeError, KeyError, TypeError) as e:
+            return {"error": f"响应格式错误: {e!r}", "status": entry["status"]}
+    return result
+
+
+class ReplayClient:
+    """代替 AutoDLClient，按回放进度返回每个请求最近一次记录的响应"""
+
+    def __init__(self):
+        self.token = "replay"
+        self.fast_used_at = time.monotonic()
+        self.responses = {}
+        # 实例ID -> 按时间顺序记录的开机结果
+        self.power_ons = {}
+
+    def feed(self, entry):
+        if entry["path"] == POWER_ON_PATH:
+            instance_uuid = entry["payload"]["instance_uuid"]
+            self.power_ons.setdefault(instance_uuid, []).append(decode_entry(entry))
+        else:
+            key = payload_key(entry["path"], entry["payload"])
+            self.responses[key] = entry
+
+    def lookup(self, path, payload):
+        entry = self.responses.get(payload_key(path, payload))
+        if entry is None:
+            return {"error": "回放日志中没有该请求"}
+        return decode_entry(entry)
+
+    async def machine_list(self, page_index=1, page_size=4):
+        payload = {"page_index": page_index, "page_size": page_size}
+        return self.lookup(MACHINE_LIST_PATH, payload)
+
+    async def instance_list(self, page_index=1, page_size=10):
+        payload = {"page_index": page_index, "page_size": page_size}
+        return self.lookup(INSTANCE_LIST_PATH, payload)
+
+    async def power_on(self, instance_uuid):
+        # 按顺序返回该实例记录中的开机结果，不发出真实请求
+        results = self.power_ons.get(instance_uuid)
+        if results:
+            return results.pop(0)
+        return {"code": "Replay", "msg": "回放中不发送开机请求"}
+
+    async def warm(self):
+        self.fast_used_at = time.monotonic()
+
+    def close(self):
+        pass
+
+
+def group_polls(entries, burst=BURST):
+    """把记录分成若干次检查，返回 [(检查时刻, 记录列表)]
+
+    机器列表请求与上一个间隔超过 burst 秒，或同一页在本次检查中已经出现过，
+    都视为新一次检查的开始。
+    """
+    polls = []
+    seen = set()
+    last_t = None
+    for entry in entries:
+        if entry["path"] == MACHINE_LIST_PATH:
+            key = payload_key(entry["path"], entry["payload"])
+            if last_t is None or entry["t"] - last_t > burst or key in seen:
+                polls.append((entry["t"], []))
+                seen = set()
+            seen.add(key)
+            last_t = entry["t"]
+        if polls:
+            polls[-1][1].append(entry)
+    return polls
+
+
+class ReplayDriver:
+    """按记录的节奏（除以 speed）把每次检查的快照交给 watcher.process_snapshot
+
+    快照由每一页最近一次成功的响应合并而成，同一台机器取最新的一页。
+    watcher 的时钟换成记录中的时间，冷却、连续次数和开机确认等判断与在线时一致。
+    """
+
+    def __init__(self, watcher, entries, speed=1.0):
+        self.watcher = watcher
+        self.client = watcher.client
+        self.polls = group_polls(entries)
+        self.speed = speed
+        self.now = self.polls[0][0] if self.polls else 0.0
+        self.pages = {}
+        self.durations = []
+        watcher.clock = lambda: self.now
+        watcher.sleep = self.sleep
+        # 回放中开机不会成功，失败后不必重试
+        watcher.sniper.deadline = 0.0
+
+    async def sleep(self, delay):
+        # 开机确认等后台任务的等待同样按倍速缩短，尽快回放时只让出事件循环
+        await asyncio.sleep(delay / self.speed if self.speed else 0)
+
+    def snapshot(self):
+        machines = {}
+        first = None
+        for _, result in sorted(self.pages.values(), key=lambda page: page[0]):
+            first = first or result
+            for machine in result["data"]["list"]:
+                machines[machine.machine_id] = machine
+        if first is None:
+            return {"error": "回放日志中还没有成功的机器列表响应"}
+        pages = [result for _, result in self.pages.values()]
+        return merge_pages(first, list(machines.values()), pages)
+
+    async def run(self):
+        started = time.monotonic()
+        for t, entries in self.polls:
+            if self.speed:
+                # 按倍速等到该次检查的时刻，处理耗时计入等待
+                delay = (t - self.polls[0][0]) / self.speed - (
+                    time.monotonic() - started
+                )
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            self.now = t
+            snapshot = None
+            for entry in entries:
+                self.client.feed(entry)
+                if entry["path"] != MACHINE_LIST_PATH:
+                    continue
+                result = decode_entry(entry)
+                if "error" in result or result.get("code") != "Success":
+                    # 这次检查中有请求失败，与在线时一样作为错误处理
+                    snapshot = snapshot or result
+                    continue
+                key = payload_key(entry["path"], entry["payload"])
+                self.pages[key] = (entry["t"], result)
+            snapshot = snapshot or self.snapshot()
+            processing = time.perf_counter()
+            self.watcher.process_snapshot(snapshot, processing)
+            self.durations.append(time.perf_counter() - processing)
+            # 让通知、开机等后台任务有机会运行
+            await asyncio.sleep(0)
+        return self.summary(time.monotonic() - started)
+
+    def summary(self, wall):
+        durations = sorted(self.durations)
+        span = self.polls[-1][0] - self.polls[0][0] if self.polls else 0.0
+        return {
+            "polls": len(self.polls),
+            "span": span,
+            "wall": wall,
+            "process_p50": statistics.median(durations) if durations else None,
+            "process_max": durations[-1] if durations else None,
+        }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="回放记录的 API 流量")
+    parser.add_argument("log", help="daemon.py --record 写入的记录文件")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放倍速，0 表示尽快")
+    parser.add_argument("--machine", action="append", default=[], help="要监控的机器ID")
+    parser.add_argument("--instance", action="append", default=[], help="自动开机的实例ID")
+    parser.add_argument("--threshold", type=int, default=1, help="空闲GPU阈值")
+    parser.add_argument("--rules", default=None, help="监控规则文件（JSON）")
+    parser.add_argument("--notify", action="append", default=[], help="通知渠道，同 daemon.py")
+    parser.add_argument("--smtp-server", default="localhost:25")
+    return parser.parse_args()
+
+
+async def main():
+    args = parse_args()
+    entries = read_log(args.log)
+    if not entries:
+        raise SystemExit(f"{args.log} 中没有记录")
+    client = ReplayClient()
+    watcher = Watcher(client, threshold=args.threshold)
+    watcher.monitored_machines.update(args.machine)
+    watcher.arm(args.instance)
+    if args.rules:
+        watcher.rules = read_rules(args.rules)
+    notifier = build_notifier(args)
+    subscribe_output(watcher, notifier)
+    driver = ReplayDriver(watcher, entries, args.speed)
+    try:
+        summary = await driver.run()
+    finally:
+        await notifier.close()
+    print(
+        f"回放 {summary['polls']} 次检查，记录时长 {summary['span']:.0f} 秒，"
+        f"用时 {summary['wall']:.2f} 秒；"
+        f"每次处理中位数 {(summary['process_p50'] or 0) * 1000:.2f}ms，"
+        f"最长 {(summary['process_max'] or 0) * 1000:.2f}ms"
+    )
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
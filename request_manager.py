@@ -0,0 +1,59 @@
+import asyncio
+
+
+class RequestManager:
+    """管理请求的生命周期
+
+    coalesce: 相同的请求已在途时不再重复发送，所有调用方等待同一个结果。
+    latest:   同一通道（如翻页）上发起新请求时取消旧请求；结果带有序号，
+              比已交付的结果更旧时丢弃，保证界面不会被过期的响应覆盖。
+
+    请求本身在客户端固定大小的线程池中执行，这里只负责调度。
+    """
+
+    def __init__(self):
+        self.in_flight = {}
+        self.sequence = 0
+        self.tasks = {}
+        self.delivered = {}
+
+    async def coalesce(self, key, factory):
+        """key 相同的请求共享一个任务；结果对象由所有调用方共享，不应修改"""
+        task = self.in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self.in_flight[key] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        # 某个调用方被取消时不影响其它仍在等待的调用方
+        return await asyncio.shield(task)
+
+    async def latest(self, channel, coro):
+        """在 channel 上执行 coro，被更新的请求取代时返回 None"""
+        self.sequence += 1
+        sequence = self.sequence
+        previous = self.tasks.get(channel)
+        if previous is not None and not previous.done():
+            previous.cancel()
+        task = asyncio.ensure_future(coro)
+        self.tasks[channel] = task
+        try:
+            result = await task
+        except asyncio.CancelledError:
+            if self.tasks.get(channel) is not task:
+                return None
+            raise
+        finally:
+            if self.tasks.get(channel) is task and task.done():
+                del self.tasks[channel]
+        if sequence < self.delivered.get(channel, 0):
+            return None
+        self.delivered[channel] = sequence
+        return result
+
+    def cancel(self, channel=None):
+        """取消某个通道（默认全部）上正在进行的请求"""
+        channels = [channel] if channel is not None else list(self.tasks)
+        for name in channels:
+            task = self.tasks.pop(name, None)
+            if task is not None:
+                task.cancel()
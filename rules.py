@@ -0,0 +1,271 @@
+"""声明式监控规则，每次检查时对整个快照批量评估
+
+规则文件为 JSON 列表，例如:
+
+    [
+      {"name": "4090 两张空闲", "gpu_name": "4090", "min_idle": 2},
+      {"name": "ABC 合计4张", "machines": ["A", "B", "C"], "total_idle": 4,
+       "action": {"power_on": "实例ID"}},
+      {"name": "连续3次正常", "machines": ["A"], "healthy_polls": 3,
+       "action": {"command": "echo $AUTODL_MACHINES"}}
+    ]
+
+条件（都可省略，同时给出时需全部满足）:
+    machines       只看这些机器；省略时看快照中的所有机器（需要检查全部页）
+    gpu_name       GPU 型号的正则表达式，不区分大小写
+    min_idle       单台机器空闲GPU数量下限；没有其它条件时默认为 1
+    healthy_polls  连续若干次检查都处于健康且在线的状态
+    total_idle     满足上述条件的机器空闲GPU合计下限，给出时规则按整体触发
+
+动作: "notify"（默认）、{"power_on": "实例ID"} 或 {"command": "命令"}。
+与阈值通知一样，只在条件由不满足变为满足时触发，之后 cooldown 秒内不重复。
+"""
+
+import asyncio
+import json
+import os
+import re
+from bisect import bisect_right
+from operator import attrgetter
+
+from records import STATUS_FREE, STATUS_FULL
+
+ACTION_NOTIFY = "notify"
+ACTION_POWER_ON = "power_on"
+ACTION_COMMAND = "command"
+
+HEALTHY = (STATUS_FREE, STATUS_FULL)
+MACHINE_ID = attrgetter("machine_id")
+
+
+class RuleError(ValueError):
+    pass
+
+
+def parse_action(action):
+    if action == ACTION_NOTIFY:
+        return ACTION_NOTIFY, None
+    if isinstance(action, dict) and len(action) == 1:
+        kind, arg = next(iter(action.items()))
+        if kind in (ACTION_POWER_ON, ACTION_COMMAND) and isinstance(arg, str) and arg:
+            return kind, arg
+    raise RuleError(f"无法识别的动作: {action!r}")
+
+
+class Rule:
+    def __init__(
+        self,
+        name,
+        machines=None,
+        gpu_name=None,
+        min_idle=None,
+        healthy_polls=None,
+        total_idle=None,
+        action=ACTION_NOTIFY,
+        cooldown=60.0,
+    ):
+        self.name = name
+        self.machine_ids = frozenset(machines) if machines else None
+        try:
+            self.pattern = re.compile(gpu_name, re.IGNORECASE) if gpu_name else None
+        except re.error as e:
+            raise RuleError(f"规则 {name}: gpu_name 不是有效的正则表达式: {e}")
+        if min_idle is None and healthy_polls is None and total_idle is None:
+            min_idle = 1
+        self.min_idle = min_idle
+        self.healthy_polls = healthy_polls
+        self.total_idle = total_idle
+        self.action = parse_action(action)
+        self.cooldown = cooldown
+        # GPU 型号只有少数几种，每种只做一次正则匹配
+        self.gpu_hits = {}
+        self.matches = self.compile()
+        # 已触发且仍满足条件的机器（整体规则为 {None}），以及上次触发的时刻
+        self.active = set()
+        self.last_fired = {}
+        # 满足条件但仍在冷却期内、等待触发的机器
+        self.pending = set()
+
+    @property
+    def aggregate(self):
+        return self.total_idle is not None
+
+    def gpu_matches(self, gpu_name):
+        if self.pattern is None:
+            return True
+        hit = self.gpu_hits.get(gpu_name)
+        if hit is None:
+            hit = self.gpu_hits[gpu_name] = self.pattern.search(gpu_name) is not None
+        return hit
+
+    def compile(self):
+        """把条件组合成一个判断函数 matches(machine, healthy_streak)"""
+        checks = []
+        if self.pattern is not None:
+            gpu_matches = self.gpu_matches
+            checks.append(lambda machine, streak: gpu_matches(machine.gpu_name))
+        if self.min_idle is not None:
+            min_idle = self.min_idle
+            checks.append(lambda machine, streak: machine.gpu_idle >= min_idle)
+        if self.healthy_polls is not None:
+            polls = self.healthy_polls
+            checks.append(lambda machine, streak: streak >= polls)
+
+        if not checks:
+            return lambda machine, streak: True
+        if len(checks) == 1:
+            return checks[0]
+        return lambda machine, streak: all(check(machine, streak) for check in checks)
+
+    def select(self, groups, streaks):
+        """从按型号分组、组内按空闲GPU降序排列的机器中取出满足条件的机器"""
+        matched = []
+        for gpu_name, (machines, negative_idle) in groups.items():
+            if not self.gpu_matches(gpu_name):
+                continue
+            if self.min_idle is not None:
+                machines = machines[: bisect_right(negative_idle, -self.min_idle)]
+            if self.healthy_polls is not None:
+                polls = self.healthy_polls
+                machines = [m for m in machines if streaks[m.machine_id] >= polls]
+            matched.extend(machines)
+        return matched
+
+    def cooled_down(self, key, now):
+        last = self.last_fired.get(key)
+        if last is not None and now - last < self.cooldown:
+            return False
+        self.last_fired[key] = now
+        return True
+
+    def update(self, seen, matched, now):
+        """根据本次快照中满足条件的机器更新状态，返回本次触发的机器列表
+
+        冷却期内满足条件的机器不记为已触发，冷却结束后仍满足时再触发。
+        """
+        if self.aggregate:
+            total = sum(machine.gpu_idle for machine in matched)
+            if total < self.total_idle:
+                self.active = set()
+                self.pending = set()
+                return []
+            if self.active:
+                return []
+            if not self.cooled_down(None, now):
+                self.pending = {None}
+                return []
+            self.active = {None}
+            self.pending = set()
+            return matched
+        ids = set(map(MACHINE_ID, matched))
+        # 不在本次快照中的机器保持原来的状态
+        self.active -= seen - ids
+        fired = [
+            machine
+            for machine in matched
+            if machine.machine_id not in self.active
+            and self.cooled_down(machine.machine_id, now)
+        ]
+        self.active |= set(map(MACHINE_ID, fired))
+        self.pending = ids - self.active
+        return fired
+
+
+class RuleSet:
+    """批量评估规则
+
+    指定了机器的规则按机器ID索引，只对这些机器调用 matches；未指定机器的
+    规则共用一次按型号分组并排序的结果，按空闲数二分取出满足条件的机器，
+    不必逐台机器逐条规则判断。
+    """
+
+    def __init__(self, rules=()):
+        self.rules = list(rules)
+        self.by_machine = {}
+        self.global_rules = []
+        for rule in self.rules:
+            if rule.machine_ids is None:
+                self.global_rules.append(rule)
+            else:
+                for machine_id in rule.machine_ids:
+                    self.by_machine.setdefault(machine_id, []).append(rule)
+        # 机器ID -> 连续处于健康且在线状态的检查次数
+        self.streaks = {}
+
+    def __len__(self):
+        return len(self.rules)
+
+    @property
+    def counts_polls(self):
+        """有按连续检查次数判断的规则时，快照没有变化也需要每次评估"""
+        return any(rule.healthy_polls is not None for rule in self.rules)
+
+    @property
+    def pending(self):
+        """有规则在冷却期内等待触发时，快照没有变化也需要再评估"""
+        return any(rule.pending for rule in self.rules)
+
+    @property
+    def machine_ids(self):
+        """规则中明确指定的机器，需要和被监控的机器一起检查"""
+        return self.by_machine.keys()
+
+    def evaluate(self, machines, now):
+        """返回 [(rule, 触发的机器列表)]，now 为 time.monotonic()"""
+        if not self.rules:
+            return []
+        matched = {rule: [] for rule in self.rules}
+        streaks = self.streaks
+        by_machine = self.by_machine
+        groups = {}
+        for machine in machines:
+            machine_id = machine.machine_id
+            if machine.status in HEALTHY:
+                streak = streaks[machine_id] = streaks.get(machine_id, 0) + 1
+            else:
+                streak = streaks[machine_id] = 0
+            for rule in by_machine.get(machine_id, ()):
+                if rule.matches(machine, streak):
+                    matched[rule].append(machine)
+            if self.global_rules:
+                groups.setdefault(machine.gpu_name, []).append(machine)
+
+        if self.global_rules:
+            for gpu_name, group in groups.items():
+                group.sort(key=attrgetter("gpu_idle"), reverse=True)
+                groups[gpu_name] = (group, [-m.gpu_idle for m in group])
+            for rule in self.global_rules:
+                matched[rule] = rule.select(groups, streaks)
+
+        seen = set(map(MACHINE_ID, machines))
+        fired = []
+        for rule in self.rules:
+            triggered = rule.update(seen, matched[rule], now)
+            if triggered:
+                fired.append((rule, triggered))
+        return fired
+
+
+def load_rules(path):
+    with open(path, "r", encoding="utf-8") as f:
+        specs = json.load(f)
+    rules = []
+    for i, spec in enumerate(specs):
+        spec = dict(spec)
+        spec.setdefault("name", f"规则{i + 1}")
+        try:
+            rules.append(Rule(**spec))
+        except TypeError as e:
+            raise RuleError(f"规则 {spec['name']}: {e}")
+    return RuleSet(rules)
+
+
+async def run_command(command, rule, machines):
+    """执行规则的命令，规则名和机器ID通过环境变量传入，返回退出码"""
+    env = {
+        **os.environ,
+        "AUTODL_RULE": rule.name,
+        "AUTODL_MACHINES": ",".join(machine.machine_id for machine in machines),
+    }
+    process = await asyncio.create_subprocess_shell(command, env=env)
+    return await process.wait()
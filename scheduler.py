@@ -0,0 +1,92 @@
+import asyncio
+import random
+import time
+
+
+class RateLimiter:
+    """令牌桶限速，限制每秒发往 API 的请求数，需在事件循环线程中使用"""
+
+    def __init__(self, rate=10.0, burst=10):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class PollScheduler:
+    """计算下一次检查前的等待时间
+
+    成功时按自适应的节奏（扣除本次检查耗时）等待，出错时按指数退避，
+    两种情况都加入随机抖动，避免多个客户端同时请求。退避不短于正常的
+    检查间隔，上限为 max_backoff 与 interval * backoff_factor 中较大者；
+    服务端给出 Retry-After 时至少等待该时间。
+
+    自适应节奏在 interval * fast 与 interval * slow 之间变化：被监控的机器
+    距离阈值只差 near 张卡以内，或快照刚发生变化时按下限检查；之后每次没有
+    变化，间隔乘以 growth，直到上限。
+    """
+
+    def __init__(
+        self,
+        interval=5.0,
+        jitter=0.1,
+        max_backoff=300.0,
+        backoff_factor=16,
+        fast=0.5,
+        slow=2.0,
+        growth=1.2,
+        near=1,
+    ):
+        self.interval = interval
+        self.jitter = jitter
+        self.max_backoff = max_backoff
+        self.backoff_factor = backoff_factor
+        self.fast = fast
+        self.slow = slow
+        self.growth = growth
+        self.near = near
+        self.failures = 0
+        # 连续没有变化的检查次数，以及最近一次的阈值差距
+        self.quiet = 0
+        self.gap = None
+
+    def observe(self, changed, gap=None):
+        """记录一次成功检查：changed 为快照是否变化，gap 为被监控机器中
+        距离阈值最少还差几张空闲卡（没有未达到阈值的机器时为 None）"""
+        self.quiet = 0 if changed else self.quiet + 1
+        self.gap = gap
+
+    def current_interval(self):
+        """按最近的检查结果得到的基础间隔，不含抖动和退避"""
+        floor = self.interval * self.fast
+        if self.gap is not None and self.gap <= self.near:
+            return floor
+        return min(self.interval * self.slow, floor * self.growth**self.quiet)
+
+    def next_delay(self, success, elapsed=0.0, retry_after=None):
+        if success:
+            self.failures = 0
+            delay = max(0.0, self.current_interval() - elapsed)
+        else:
+            self.failures += 1
+            limit = max(self.max_backoff, self.interval * self.backoff_factor)
+            delay = min(limit, self.interval * 2**self.failures)
+            delay = max(delay, self.current_interval())
+        delay *= 1 + random.uniform(-self.jitter, self.jitter)
+        if not success and retry_after:
+            # 抖动之后再保证不早于服务端要求的时间
+            delay = max(delay, retry_after)
+        return delay
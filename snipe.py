@@ -0,0 +1,89 @@
+import asyncio
+import statistics
+import time
+from collections import deque
+
+# 空闲卡被别人抢先占用时开机接口返回的 code，只有这种失败值得立即重试
+RETRY_CODES = frozenset({"InsufficientGpu"})
+
+
+def card_taken(result):
+    """开机失败是否因为空闲卡已被占用"""
+    return "error" not in result and result.get("code") in RETRY_CODES
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+class SnipeStats:
+    """记录最近若干次抢卡的延迟"""
+
+    def __init__(self, size=200):
+        self.records = deque(maxlen=size)
+
+    def add(self, record):
+        self.records.append(record)
+
+    def summary(self):
+        detect = [r["detect_to_request"] for r in self.records]
+        ack = [r["request_to_ack"] for r in self.records]
+        return {
+            "count": len(self.records),
+            "success": sum(r["success"] for r in self.records),
+            "detect_to_request_p50": percentile(detect, 50),
+            "detect_to_request_p90": percentile(detect, 90),
+            "request_to_ack_p50": percentile(ack, 50),
+            "request_to_ack_p90": percentile(ack, 90),
+        }
+
+
+class Sniper:
+    """从检测到空闲卡到发出开机请求的快速通道
+
+    开机请求走客户端的独立连接；卡被别人抢走导致开机失败时，
+    在 deadline 秒内每隔 retry_delay 秒重试，其它失败（余额不足、
+    实例不存在、认证失败、HTTP 错误等）重试也不会成功，直接返回。空闲超过 keepalive 秒时
+    主动发一个轻量请求，保证需要开机时连接已经建立好。
+    """
+
+    def __init__(self, client, deadline=10.0, retry_delay=0.5, keepalive=30.0):
+        self.client = client
+        self.deadline = deadline
+        self.retry_delay = retry_delay
+        self.keepalive = keepalive
+        self.stats = SnipeStats()
+
+    async def fire(self, instance_uuid, detected_at):
+        """detected_at 为 time.perf_counter() 下检测到空闲卡的时刻"""
+        record = {"instance_uuid": instance_uuid, "attempts": 0}
+        while True:
+            sent = time.perf_counter()
+            if not record["attempts"]:
+                record["detect_to_request"] = sent - detected_at
+            result = await self.client.power_on(instance_uuid)
+            acked = time.perf_counter()
+            record["attempts"] += 1
+            record["request_to_ack"] = acked - sent
+            success = "error" not in result and result.get("code") == "Success"
+            if not card_taken(result):
+                break
+            if acked + self.retry_delay - detected_at > self.deadline:
+                break
+            await asyncio.sleep(self.retry_delay)
+        record["success"] = success
+        record["detect_to_ack"] = acked - detected_at
+        self.stats.add(record)
+        return result, record
+
+    async def keep_warm(self):
+        while True:
+            idle = time.monotonic() - self.client.fast_used_at
+            if idle >= self.keepalive:
+                await self.client.warm()
+                idle = 0
+            await asyncio.sleep(max(1.0, self.keepalive - idle))
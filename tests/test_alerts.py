@@ -0,0 +1,62 @@
+from alerts import AvailabilityTracker, PowerOnGuard
+
+
+def test_tracker_fires_on_edge_only():
+    tracker = AvailabilityTracker(cooldown=60)
+    assert tracker.update("m", True, now=0)
+    assert not tracker.update("m", True, now=1)
+    assert not tracker.update("m", False, now=2)
+    assert tracker.update("m", True, now=70)
+    assert not tracker.update("m", True, now=80)
+
+
+def test_tracker_fires_after_cooldown_when_still_available():
+    tracker = AvailabilityTracker(cooldown=60)
+    states = [(True, 0), (False, 10), (True, 20), (True, 100), (True, 400)]
+    fired = [tracker.update("m", available, now=now) for available, now in states]
+    assert fired == [True, False, False, True, False]
+    assert not tracker.waiting
+
+
+def test_tracker_drops_waiting_when_unavailable_again():
+    tracker = AvailabilityTracker(cooldown=60)
+    tracker.update("m", True, now=0)
+    tracker.update("m", False, now=10)
+    assert not tracker.update("m", True, now=20)
+    assert tracker.waiting == {"m"}
+    assert not tracker.update("m", False, now=30)
+    assert not tracker.waiting
+
+
+def test_guard_blocks_while_in_flight_and_after_success():
+    guard = PowerOnGuard(cooldown=60)
+    assert guard.acquire("i", now=0)
+    assert not guard.acquire("i", now=0)
+    guard.release("i", True, now=1)
+    assert not guard.acquire("i", now=60)
+    assert guard.acquire("i", now=61)
+
+
+def test_guard_backs_off_after_failures():
+    guard = PowerOnGuard(failure_cooldown=30, max_failure_cooldown=100)
+    attempts = 0
+    now = 0.0
+    # 每次检查（0.5 秒一次）都尝试开机，失败后不应每次都真正发出请求
+    while now < 300:
+        if guard.acquire("i", now=now):
+            attempts += 1
+            guard.release("i", False, now=now)
+        now += 0.5
+    # 失败后依次等待 30、60、100（封顶）、100 秒：0、30、90、190、290 秒各一次
+    assert attempts == 5
+
+
+def test_guard_success_clears_failures():
+    guard = PowerOnGuard(cooldown=0, failure_cooldown=30)
+    assert guard.acquire("i", now=0)
+    guard.release("i", False, now=0)
+    assert not guard.acquire("i", now=10)
+    assert guard.acquire("i", now=30)
+    guard.release("i", True, now=30)
+    assert guard.acquire("i", now=30)
+    assert guard.retry_at("i") is None
@@ -0,0 +1,103 @@
+import pytest
+
+from auth import AuthSession, LoginError
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.body = body
+
+    def json(self):
+        return self.body
+
+
+class FakeSession:
+    def __init__(self, *bodies):
+        self.bodies = list(bodies)
+
+    def post(self, url, json=None, timeout=None):
+        return FakeResponse(self.bodies.pop(0))
+
+
+def make_auth(tmp_path, *bodies):
+    auth = AuthSession(credentials_path=str(tmp_path / "credentials.json"))
+    auth.session = FakeSession(*bodies)
+    auth.phone = "13800000000"
+    auth.hashed_password = "hash"
+    return auth
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        {"code": "Success", "data": {}},
+        {"code": "Success", "data": None},
+        {"code": "Success"},
+        [],
+    ],
+)
+def test_malformed_login_response_is_login_failure(tmp_path, body):
+    auth = make_auth(tmp_path, body)
+    with pytest.raises(LoginError):
+        auth.login_hashed(auth.phone, auth.hashed_password)
+    auth.session = FakeSession(body)
+    assert auth.relogin() is None
+
+
+def test_relogin_returns_token(tmp_path):
+    auth = make_auth(
+        tmp_path,
+        {"code": "Success", "data": {"ticket": "t"}},
+        {"code": "Success", "data": {"token": "new"}},
+    )
+    refreshed = []
+    auth.on_refresh(refreshed.append)
+    assert auth.relogin() == "new"
+    assert refreshed == ["new"]
+
+
+class FakeKeyring:
+    def __init__(self):
+        self.passwords = {}
+
+    def set_password(self, service, username, password):
+        self.passwords[service, username] = password
+
+    def get_password(self, service, username):
+        return self.passwords.get((service, username))
+
+    def delete_password(self, service, username):
+        del self.passwords[service, username]
+
+
+class BrokenKeyring:
+    def set_password(self, service, username, password):
+        raise RuntimeError("没有可用的后端")
+
+
+def test_credentials_in_keyring(tmp_path):
+    path = tmp_path / "credentials.json"
+    store = FakeKeyring()
+    auth = AuthSession(credentials_path=str(path), keyring=store)
+    auth.phone, auth.hashed_password = "13800000000", "hash"
+    assert auth.save_credentials()
+    assert "hash" not in path.read_text()
+
+    loaded = AuthSession(credentials_path=str(path), keyring=store)
+    assert loaded.load_credentials()
+    assert loaded.hashed_password == "hash"
+
+    loaded.forget_credentials()
+    assert not path.exists()
+    assert not store.passwords
+
+
+def test_credentials_fall_back_to_file(tmp_path):
+    path = tmp_path / "credentials.json"
+    for store in (None, BrokenKeyring()):
+        auth = AuthSession(credentials_path=str(path), keyring=store)
+        auth.phone, auth.hashed_password = "13800000000", "hash"
+        assert not auth.save_credentials()
+        loaded = AuthSession(credentials_path=str(path), keyring=None)
+        assert loaded.load_credentials()
+        assert loaded.hashed_password == "hash"
@@ -0,0 +1,76 @@
+import datetime
+import json
+
+import requests
+
+from engine import (
+    INSTANCE_LIST_PATH,
+    MACHINE_LIST_PATH,
+    POWER_ON_PATH,
+    AutoDLClient,
+)
+from records import STATUS_FREE, decode_machine_list
+
+
+class FakeSession:
+    def __init__(self, body, status=200):
+        self.body = body
+        self.status = status
+
+    def post(self, url, data=None, headers=None, timeout=None):
+        response = requests.Response()
+        response.status_code = self.status
+        response._content = json.dumps(self.body).encode()
+        response.elapsed = datetime.timedelta(0)
+        return response
+
+
+def post(body, path=MACHINE_LIST_PATH, decode=decode_machine_list):
+    client = AutoDLClient("token")
+    try:
+        return client._post(
+            FakeSession(body),
+            path,
+            {"page_index": 1, "page_size": 4},
+            {"Authorization": "token"},
+            decode,
+        )
+    finally:
+        client.close()
+
+
+def test_malformed_machine_becomes_error():
+    # 机器记录缺少 gpu 字段
+    body = {"code": "Success", "data": {"list": [{"machine_id": "m"}]}}
+    result = post(body)
+    assert "error" in result
+    assert result["status"] == 200
+
+
+def test_wrong_field_type_becomes_error():
+    body = {"code": "Success", "data": {"list": [{"gpu": None}]}}
+    assert "error" in post(body)
+
+
+def test_non_object_response_becomes_error():
+    assert "error" in post([])
+    for path in (INSTANCE_LIST_PATH, POWER_ON_PATH):
+        for body in ([], "Success", None, 1):
+            result = post(body, path=path, decode=None)
+            assert "error" in result
+            assert result["status"] == 200
+
+
+def test_valid_response_is_decoded():
+    machine = {
+        "machine_id": "m",
+        "machine_name": "m",
+        "gpu_name": "RTX 4090",
+        "gpu": {"idle": 1, "total": 8},
+        "online_status": 2,
+        "health_status": 0,
+    }
+    result = post({"code": "Success", "data": {"list": [machine]}})
+    decoded = result["data"]["list"][0]
+    assert decoded.gpu_idle == 1
+    assert decoded.status == STATUS_FREE
@@ -0,0 +1,185 @@
+import asyncio
+
+from accounts import MultiWatcher
+from engine import SCOPE_MONITORED, Watcher
+from records import (
+    STATUS_FAULT,
+    STATUS_FREE,
+    STATUS_FULL,
+    STATUS_OFFLINE,
+    Machine,
+    decode_machine_list,
+    fingerprint,
+)
+from rules import Rule, RuleSet
+
+
+def machine(machine_id, gpu_idle, gpu_total=8, online_status=2, health_status=0):
+    # API 中在线为 online_status == 2，健康为 health_status == 0
+    return Machine(
+        machine_id,
+        machine_id,
+        "RTX 4090",
+        gpu_idle,
+        gpu_total,
+        online_status,
+        health_status,
+    )
+
+
+def snapshot(*machines):
+    return {
+        "code": "Success",
+        "data": {"list": list(machines)},
+        "fingerprint": fingerprint(machines),
+    }
+
+
+class FakeClient:
+    """按页返回固定机器列表的客户端"""
+
+    token = "token"
+    fast_used_at = 0.0
+
+    def __init__(self, machines):
+        self.machines = machines
+        self.calls = 0
+
+    async def machine_list(self, page_index=1, page_size=4, token=None):
+        self.calls += 1
+        start = (page_index - 1) * page_size
+        return decode_machine_list(
+            {
+                "code": "Success",
+                "data": {
+                    "list": [
+                        {
+                            "machine_id": m.machine_id,
+                            "machine_name": m.machine_name,
+                            "gpu_name": m.gpu_name,
+                            "gpu": {"idle": m.gpu_idle, "total": m.gpu_total},
+                            "online_status": m.online_status,
+                            "health_status": m.health_status,
+                        }
+                        for m in self.machines[start : start + page_size]
+                    ],
+                    "result_total": len(self.machines),
+                },
+            }
+        )
+
+
+def count_events(watcher, event):
+    events = []
+    watcher.subscribe(event, lambda *args: events.append(args))
+    return events
+
+
+def make_watcher(monitored=(), threshold=1):
+    watcher = Watcher(None, threshold=threshold)
+    watcher.monitored_machines.update(monitored)
+    watcher.scheduler.jitter = 0.0
+    return watcher
+
+
+def test_gap_counts_only_monitored_machines_below_threshold():
+    watcher = make_watcher(["a", "b"], threshold=3)
+    watcher.process_snapshot(snapshot(machine("a", 0), machine("b", 1)), 0.0)
+    assert watcher.gap == 2
+    watcher.process_snapshot(snapshot(machine("a", 3), machine("c", 2)), 0.0)
+    assert watcher.gap is None
+
+
+def test_scheduler_follows_snapshots():
+    watcher = make_watcher(["a"], threshold=2)
+    interval = watcher.interval
+    watcher.process_snapshot(snapshot(machine("a", 0)), 0.0)
+    assert watcher.scheduler.next_delay(True) == interval * watcher.scheduler.fast
+    for _ in range(20):
+        watcher.process_snapshot(snapshot(machine("a", 0)), 0.0)
+    assert watcher.scheduler.next_delay(True) == interval * watcher.scheduler.slow
+    # 只差一张卡时回到最短间隔
+    watcher.process_snapshot(snapshot(machine("a", 1)), 0.0)
+    watcher.process_snapshot(snapshot(machine("a", 1)), 0.0)
+    assert watcher.scheduler.next_delay(True) == interval * watcher.scheduler.fast
+
+
+def test_nothing_watched_is_unchanged():
+    client = FakeClient([machine("a", 0), machine("b", 0)])
+    watcher = Watcher(client, scope=SCOPE_MONITORED, catalog_page_size=1)
+    statuses = count_events(watcher, "status")
+
+    async def run():
+        # 第一次检查建立页码索引，之后没有需要拉取的页
+        for _ in range(5):
+            await watcher.check_status()
+
+    asyncio.run(run())
+    assert client.calls == 2
+    assert len(statuses) == 2
+
+
+def test_multi_account_identical_polls_emit_once():
+    client = FakeClient([machine("a", 0), machine("b", 0)])
+    multi = MultiWatcher(client, catalog_page_size=1)
+    # 两个账号监控同一台机器，第二个账号没有自己需要拉取的页
+    multi.add_account("A", "ta", machines=["a"])
+    multi.add_account("B", "tb", machines=["a"])
+    statuses = count_events(multi, "status")
+
+    async def run():
+        for account in multi.accounts:
+            account.watcher.page_index_map.rebuild(client.machines)
+        for _ in range(5):
+            await multi.check_status()
+
+    asyncio.run(run())
+    assert len(statuses) == 1
+
+
+def test_apply_settings_replaces_monitoring_settings():
+    watcher = make_watcher(["old"])
+    watcher.instances["i"] = {"instance_uuid": "i", "machine_id": "a"}
+    monitored = {"a"}
+    watcher.apply_settings(monitored, {"i"}, SCOPE_MONITORED, 2)
+    assert watcher.monitored_machines == {"a"}
+    assert watcher.machine_instances == {"a": [watcher.instances["i"]]}
+    assert (watcher.scope, watcher.threshold) == (SCOPE_MONITORED, 2)
+
+
+def test_alert_suppressed_by_cooldown_fires_on_unchanged_poll():
+    watcher = make_watcher(["a"])
+    now = [0.0]
+    watcher.clock = lambda: now[0]
+    alerts = count_events(watcher, "available")
+    for idle, t in [(1, 0), (0, 10), (1, 20)]:
+        now[0] = t
+        watcher.process_snapshot(snapshot(machine("a", idle)), 0.0)
+    assert len(alerts) == 1
+    # 快照没有变化，但冷却已经结束，机器仍然空闲
+    now[0] = 100
+    watcher.process_snapshot(snapshot(machine("a", 1)), 0.0)
+    assert len(alerts) == 2
+
+
+def test_fixture_machines_use_api_status_values():
+    assert machine("a", 1).status == STATUS_FREE
+    assert machine("a", 0).status == STATUS_FULL
+    assert machine("a", 1, online_status=1).status == STATUS_OFFLINE
+    assert machine("a", 1, health_status=1).status == STATUS_FAULT
+
+
+def test_healthy_polls_rule_counts_unchanged_polls():
+    watcher = make_watcher()
+    watcher.rules = RuleSet([Rule("r", machines=["a"], healthy_polls=3)])
+    fired = count_events(watcher, "rule")
+    for _ in range(2):
+        watcher.process_snapshot(snapshot(machine("a", 0)), 0.0)
+    assert not fired
+    watcher.process_snapshot(snapshot(machine("a", 0)), 0.0)
+    assert len(fired) == 1
+    # 出现故障后重新计数
+    watcher.process_snapshot(snapshot(machine("a", 0, health_status=1)), 0.0)
+    for _ in range(2):
+        watcher.process_snapshot(snapshot(machine("a", 0)), 0.0)
+    assert len(fired) == 1
@@ -0,0 +1,30 @@
+from metrics import Registry
+
+
+def test_render_mixed_label_types():
+    registry = Registry()
+    requests = registry.counter("requests_total", "请求数", ["path", "status"])
+    errors = registry.counter("errors_total", "错误数", ["path", "code"])
+    seconds = registry.histogram("seconds", "耗时", ["status"], buckets=(1.0,))
+    requests.inc(path="/a", status=200)
+    requests.inc(path="/a", status="network")
+    errors.inc(path="/a", code=None)
+    errors.inc(path="/a", code="Fail")
+    seconds.observe(0.5, status=200)
+    seconds.observe(2.0, status="network")
+
+    text = registry.render()
+
+    assert 'requests_total{path="/a",status="200"} 1' in text
+    assert 'requests_total{path="/a",status="network"} 1' in text
+    assert 'errors_total{path="/a",code="None"} 1' in text
+    assert 'seconds_bucket{status="network",le="+Inf"} 1' in text
+
+
+def test_same_label_value_as_int_and_str():
+    registry = Registry()
+    requests = registry.counter("requests_total", "请求数", ["status"])
+    requests.inc(status=200)
+    requests.inc(status="200")
+
+    assert requests.snapshot() == {"200": 2}
@@ -0,0 +1,35 @@
+import asyncio
+import json
+
+from engine import POWER_ON_PATH
+from replay import ReplayClient, decode_entry
+
+
+def power_on_entry(instance_uuid, code):
+    return {
+        "t": 0.0,
+        "path": POWER_ON_PATH,
+        "payload": {"instance_uuid": instance_uuid, "start_mode": "gpu"},
+        "status": 200,
+        "body": json.dumps({"code": code, "data": None, "msg": ""}),
+    }
+
+
+def test_power_on_results_are_keyed_by_instance():
+    client = ReplayClient()
+    client.feed(power_on_entry("a", "Success"))
+    client.feed(power_on_entry("b", "BalanceNotEnough"))
+    client.feed(power_on_entry("a", "Again"))
+
+    async def run():
+        return [
+            (await client.power_on(uuid))["code"] for uuid in ("b", "a", "a", "b")
+        ]
+
+    assert asyncio.run(run()) == ["BalanceNotEnough", "Success", "Again", "Replay"]
+
+
+def test_non_object_body_is_an_error():
+    entry = power_on_entry("a", "Success")
+    entry["body"] = "[]"
+    assert "error" in decode_entry(entry)
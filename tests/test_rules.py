@@ -0,0 +1,60 @@
+from records import Machine
+from rules import Rule, RuleSet
+
+
+def machine(machine_id, gpu_idle, gpu_name="RTX 4090"):
+    return Machine(machine_id, machine_id, gpu_name, gpu_idle, 8, 2, 0)
+
+
+def run(rules, polls):
+    """polls 为 [(时刻, 机器列表)]，返回每次触发的 (规则名, 机器ID列表)"""
+    rule_set = RuleSet(rules)
+    return [
+        [
+            (rule.name, [m.machine_id for m in machines])
+            for rule, machines in rule_set.evaluate(snapshot, now)
+        ]
+        for now, snapshot in polls
+    ]
+
+
+def test_rule_fires_on_edge_only():
+    rule = Rule("r", min_idle=1, cooldown=60)
+    polls = [(0, [machine("a", 1)]), (1, [machine("a", 1)]), (2, [machine("a", 0)])]
+    assert run([rule], polls) == [[("r", ["a"])], [], []]
+
+
+def test_rule_fires_after_cooldown_when_still_matching():
+    rule = Rule("r", machines=["a"], min_idle=1, cooldown=60)
+    polls = [
+        (0, [machine("a", 1)]),
+        (10, [machine("a", 0)]),
+        (20, [machine("a", 1)]),
+        (100, [machine("a", 1)]),
+        (400, [machine("a", 1)]),
+    ]
+    assert run([rule], polls) == [[("r", ["a"])], [], [], [("r", ["a"])], []]
+    assert not rule.pending
+
+
+def test_aggregate_rule_fires_after_cooldown():
+    rule = Rule("sum", machines=["a", "b"], total_idle=2, cooldown=60)
+    polls = [
+        (0, [machine("a", 1), machine("b", 1)]),
+        (10, [machine("a", 0), machine("b", 1)]),
+        (20, [machine("a", 1), machine("b", 1)]),
+        (100, [machine("a", 1), machine("b", 1)]),
+    ]
+    fired = run([rule], polls)
+    assert [bool(f) for f in fired] == [True, False, False, True]
+
+
+def test_pending_rule_set():
+    rule = Rule("r", min_idle=1, cooldown=60)
+    rule_set = RuleSet([rule])
+    rule_set.evaluate([machine("a", 1)], 0)
+    rule_set.evaluate([machine("a", 0)], 10)
+    rule_set.evaluate([machine("a", 1)], 20)
+    assert rule_set.pending
+    rule_set.evaluate([machine("a", 0)], 30)
+    assert not rule_set.pending
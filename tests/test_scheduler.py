@@ -0,0 +1,81 @@
+import pytest
+
+from scheduler import PollScheduler
+
+
+def make_scheduler(**options):
+    return PollScheduler(interval=10.0, jitter=0.0, **options)
+
+
+def test_fixed_interval_before_any_observation():
+    scheduler = make_scheduler(fast=1.0, slow=1.0)
+    assert scheduler.next_delay(True) == 10.0
+    assert scheduler.next_delay(True, elapsed=4.0) == 6.0
+
+
+def test_changed_snapshot_polls_at_floor():
+    scheduler = make_scheduler()
+    scheduler.observe(changed=True)
+    assert scheduler.next_delay(True) == pytest.approx(5.0)
+
+
+def test_quiet_polls_slow_down_to_ceiling():
+    scheduler = make_scheduler(growth=2.0)
+    scheduler.observe(changed=True)
+    delays = []
+    for _ in range(4):
+        scheduler.observe(changed=False)
+        delays.append(scheduler.next_delay(True))
+    assert delays == pytest.approx([10.0, 20.0, 20.0, 20.0])
+
+
+def test_near_threshold_stays_at_floor():
+    scheduler = make_scheduler()
+    for _ in range(10):
+        scheduler.observe(changed=False, gap=1)
+    assert scheduler.next_delay(True) == pytest.approx(5.0)
+    # 还差得多时按没有变化的次数放慢
+    scheduler.observe(changed=False, gap=3)
+    assert scheduler.next_delay(True) == pytest.approx(20.0)
+
+
+def test_change_resets_slowdown():
+    scheduler = make_scheduler()
+    for _ in range(10):
+        scheduler.observe(changed=False)
+    assert scheduler.next_delay(True) == pytest.approx(20.0)
+    scheduler.observe(changed=True)
+    assert scheduler.next_delay(True) == pytest.approx(5.0)
+
+
+def test_errors_back_off_exponentially():
+    scheduler = make_scheduler(max_backoff=50.0, backoff_factor=2)
+    delays = [scheduler.next_delay(False) for _ in range(3)]
+    assert delays == [20.0, 40.0, 50.0]
+    assert scheduler.next_delay(False, retry_after=120) == 120
+    scheduler.observe(changed=True)
+    assert scheduler.next_delay(True) == pytest.approx(5.0)
+    assert scheduler.failures == 0
+
+
+def test_jitter_stays_within_bounds():
+    scheduler = PollScheduler(interval=10.0, jitter=0.1, fast=1.0, slow=1.0)
+    for _ in range(100):
+        assert 9.0 <= scheduler.next_delay(True) <= 11.0
+
+
+def test_backoff_never_shorter_than_normal_interval():
+    scheduler = PollScheduler(interval=600.0, jitter=0.0)
+    for _ in range(10):
+        scheduler.observe(changed=False)
+    normal = scheduler.next_delay(True)
+    delays = [scheduler.next_delay(False) for _ in range(6)]
+    assert all(delay >= normal for delay in delays)
+    assert delays == sorted(delays)
+    assert delays[-1] == 600.0 * 16
+
+
+def test_retry_after_is_respected_with_jitter():
+    scheduler = PollScheduler(interval=1.0, jitter=0.5)
+    for _ in range(100):
+        assert scheduler.next_delay(False, retry_after=120) >= 120
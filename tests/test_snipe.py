@@ -0,0 +1,49 @@
+import asyncio
+import time
+
+from alerts import PowerOnGuard
+from snipe import Sniper
+
+
+class FakeClient:
+    fast_used_at = 0.0
+
+    def __init__(self, results):
+        self.results = list(results)
+        self.calls = 0
+
+    async def power_on(self, instance_uuid):
+        self.calls += 1
+        return self.results.pop(0) if len(self.results) > 1 else self.results[0]
+
+
+def fire(results, deadline=10.0):
+    client = FakeClient(results)
+    sniper = Sniper(client, deadline=deadline, retry_delay=0.0)
+    result, record = asyncio.run(sniper.fire("i", time.perf_counter()))
+    return client, result, record
+
+
+def test_permanent_failure_is_not_retried():
+    for result in (
+        {"code": "BalanceNotEnough", "msg": "余额不足"},
+        {"code": "InstanceNotFound", "msg": "实例不存在"},
+        {"error": "HTTP 401", "status": 401},
+    ):
+        client, _, record = fire([result])
+        assert client.calls == 1
+        assert not record["success"]
+
+
+def test_taken_card_is_retried_until_success():
+    taken = {"code": "InsufficientGpu", "msg": "GPU 不足"}
+    client, result, record = fire([taken, taken, {"code": "Success"}])
+    assert client.calls == 3
+    assert record["success"]
+
+
+def test_taken_card_does_not_count_as_failure():
+    guard = PowerOnGuard(cooldown=60, failure_cooldown=30)
+    assert guard.acquire("i", now=0)
+    guard.release("i", False, now=0, penalize=False)
+    assert guard.acquire("i", now=1)